@@ -1,14 +1,23 @@
-import math
 from typing import Tuple
 
+import numpy as np
 from PIL import Image
 from tqdm import tqdm
 
+import coverage_model.prescreen
 import defintions as defs
+import pathloss.itm_jit
+import pathloss.stencils
 import terrain_map.load_map
 import terrain_map.render_map
+import terrain_map.xyz_tiles
+from coverage_model.radial import Rays
 from pathloss.free_space import free_space_distance
-from pathloss.itm import itm
+from pathloss.itm import ITMSession
+from pathloss.itm_batch import itm_batch
+from pathloss.stencils import StencilCache
+from pathloss.terrain_module import terrain_profiles_yx
+from terrain_map import TerrainMap, coordinates_distance_array
 from terrain_map.load_map import range_inclusive
 
 one_third = 1 / 3
@@ -35,52 +44,176 @@ noise_floor_dBm: float = -100
 max_att_dB: float = transmitter_power_dBm + transmitter_gain_dB + receiver_gain_dB \
                     - noise_floor_dBm - minimum_signal_to_noise_dBm
 
-
-def run(freq_MHz: float, transmitter_coords: Tuple[float, float],
-        transmitter_height: float, receiver_height: float,
-        max_surface_terrain_profile_samples: int = 600):
-    if terrain_map.load_map.loaded_terrain_map is None:
-        tm = terrain_map.load_map.generate()
-    else:
-        tm = terrain_map.load_map.loaded_terrain_map
-    render = terrain_map.render_map.render(tm, draw_roads=True)
+profile_batch_size: int = 4096  # Receivers whose profiles are extracted together
+
+NUMPY = "numpy"  # pathloss.itm_batch, all paths of a batch at once
+PYTHON = "python"  # itmlogic one path at a time, the reference implementation
+NUMBA = "numba"  # pathloss.itm_jit, falls back to NUMPY when Numba is not installed
+
+
+def attenuations(backend: str, profiles: np.ndarray, lengths: np.ndarray, distances_km: np.ndarray,
+                 freq_MHz: float, transmitter_height: float, receiver_height: float,
+                 fractions: Tuple[float, float, float] | None = None, lookup_tables: bool = False) -> np.ndarray:
+    """ITM attenuations (dB) of a batch of NaN-padded profiles (see terrain_profiles_yx) with the given backend,
+       their quantile at the fractions of time, locations and situations if given (NUMBA then uses NUMPY),
+       with the attenuation functions read from the tables of pathloss.itm_tables if lookup_tables
+       (NUMBA then uses NUMPY too)."""
+    if backend == NUMBA and pathloss.itm_jit.AVAILABLE and fractions is None and not lookup_tables:
+        return pathloss.itm_jit.itm_batch(profiles, lengths, distances_km, freq_MHz,
+                                          transmitter_height, receiver_height)
+    if backend == PYTHON:
+        session = ITMSession(freq_MHz, transmitter_height, lookup_tables=lookup_tables)
+        return np.array([session.p2p(profile[:length].tolist(), distance_km, receiver_height, fractions=fractions)
+                         for profile, length, distance_km in zip(profiles, lengths.tolist(), distances_km.tolist())])
+    return itm_batch(profiles, lengths, distances_km, freq_MHz, transmitter_height, receiver_height,
+                     fractions=fractions, lookup_tables=lookup_tables)
+
+
+def calculate_coverage(tm: TerrainMap, freq_MHz: float, transmitter_coords: Tuple[float, float],
+                       transmitter_height: float, receiver_height: float,
+                       max_surface_terrain_profile_samples: int = 600, use_pyramid: bool = False,
+                       stencils: StencilCache | None = None, backend: str = NUMPY,
+                       approximate_prescreen_margin_dB: float | None = None,
+                       reliability: float | None = None, confidence: float = 0.5, radial: bool = False,
+                       lookup_tables: bool = False) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (covered, transmitter_marker): boolean (y, x) rasters of the squares with attenuation <= max_att_dB,
+       and of the squares around the transmitter drawn as its marker.
+       Profiles are read through the stencil cache if one is given (see pathloss.stencils),
+       and evaluated with the given ITM backend (NUMPY, PYTHON or NUMBA).
+       With an approximate pre-screen margin, only the receivers whose area mode pathloss is within the margin of
+       max_att_dB get point-to-point predictions, the others are classified from area mode alone, which is lossy
+       (see coverage_model.prescreen).
+       With a reliability, squares are covered if the attenuation is <= max_att_dB that fraction of the time
+       (with the given confidence) instead of for the median attenuation.
+       With radial, profiles are read from rays cast once from the transmitter (see coverage_model.radial),
+       which cannot be combined with the pyramid or stencils.
+       With lookup_tables, ITM's attenuation functions are read from interpolated tables (see pathloss.itm_tables)."""
+    assert not (radial and (use_pyramid or stencils is not None))
+    pyramid = tm.pyramid() if use_pyramid else None
 
     transmitter_yx = tm.coords_to_map_yx(transmitter_coords)
     assert tm.exists(transmitter_yx)
 
     print('Calculating coverage')
     print('Maximum allowed attenuation = ' + str(max_att_dB) + 'dB')
+    if backend == NUMBA and not pathloss.itm_jit.AVAILABLE:
+        print('Numba is not installed, using the ' + NUMPY + ' ITM backend', flush=True)
+    elif backend == NUMBA and lookup_tables:
+        print('The ' + NUMBA + ' ITM backend has no lookup tables, using the ' + NUMPY + ' ITM backend', flush=True)
+    # Time, locations and situations (locations are not used by point-to-point predictions)
+    fractions = None if reliability is None else (reliability, 0.5, confidence)
+    if fractions is not None:
+        print('Reliability = ' + str(reliability) + ', confidence = ' + str(confidence))
 
     shape = tm.shape()
+    covered = np.zeros(shape, dtype=bool)
+    transmitter_marker = np.zeros(shape, dtype=bool)
 
     max_dist = int(round(free_space_distance(max_att_dB, freq_MHz * 1_000_000)))
     steps = round(max_dist / 25)
     _y = range_inclusive(max(transmitter_yx[0] - steps, 0), min(transmitter_yx[0] + steps, shape[0] - 1))
     _x = range_inclusive(max(transmitter_yx[1] - steps, 0), min(transmitter_yx[1] + steps, shape[1] - 1))
-    calcs = len(_y) * len(_x)
+    window = (slice(_y.start, _y.stop), slice(_x.start, _x.stop))
+
+    receivers_y, receivers_x = np.meshgrid(np.asarray(_y), np.asarray(_x), indexing='ij')
+    dist_from_transmitter = np.sqrt(((transmitter_yx[0] - receivers_y) ** 2) + ((transmitter_yx[1] - receivers_x) ** 2))
+    transmitter_marker[window] = (0 < dist_from_transmitter) & (dist_from_transmitter <= 4)
+    to_calculate = (4 < dist_from_transmitter) & (dist_from_transmitter <= steps)  # ITM requires min 100m distance
+    receivers_y = receivers_y[to_calculate]
+    receivers_x = receivers_x[to_calculate]
+
+    # Receiver coordinates and distances for all receivers in one transform call
+    receivers_lon, receivers_lat = tm.map_yx_to_coords_array(receivers_y, receivers_x)
+    distances_m = coordinates_distance_array(transmitter_coords[0], transmitter_coords[1],
+                                             receivers_lon, receivers_lat)
+
+    if approximate_prescreen_margin_dB is not None:
+        print('Warning: the area mode pre-screen is an approximation, receivers outside its margin are classified '
+              'without point-to-point predictions and some of them wrongly', flush=True)
+        certain, ambiguous = coverage_model.prescreen.approximate_classify(tm, freq_MHz, transmitter_coords,
+                                                                           transmitter_height, receiver_height,
+                                                                           distances_m,
+                                                                           dist_from_transmitter[to_calculate],
+                                                                           max_att_dB,
+                                                                           approximate_prescreen_margin_dB)
+        covered[receivers_y[certain], receivers_x[certain]] = True
+        receivers_y = receivers_y[ambiguous]
+        receivers_x = receivers_x[ambiguous]
+        distances_m = distances_m[ambiguous]
+
+    rays = Rays(tm, transmitter_yx, steps) if radial else None
+
+    calcs = len(receivers_y)
     print('Calculating up to ' + str(max_dist) + 'm away (' + str(calcs) + ' calculations)')
-    with tqdm(total=calcs, smoothing=.025) as progress_bar:
-        for y in _y:
-            for x in _x:
-                dist_from_transmitter = math.sqrt(((transmitter_yx[0] - y) ** 2) + ((transmitter_yx[1] - x) ** 2))
-                if 0 < dist_from_transmitter <= 4:
-                    terrain_map.render_map.draw_deep_pink(render, y, x)
-                elif 4 <= dist_from_transmitter <= steps:  # ITM requires min 100m distance
-                    attenuation_dB = itm(terrain=tm,
-                                         freq_MHz=freq_MHz,
-                                         transmitter_coords=transmitter_coords,
-                                         receiver_coords=tm.map_yx_to_coords((y, x)),
-                                         transmitter_height=transmitter_height,
-                                         receiver_height=receiver_height,
-                                         max_samples=max_surface_terrain_profile_samples)
-                    if attenuation_dB <= max_att_dB:
-                        terrain_map.render_map.draw_red(render, y, x, one_third)
-                progress_bar.update(1)
+
+    with tqdm(total=calcs, smoothing=.025) as progress:
+        # Profiles are extracted and evaluated in batches, all profiles of a large disc would not fit in memory
+        for start in range(0, calcs, profile_batch_size):
+            batch = slice(start, start + profile_batch_size)
+            if rays is None:
+                profiles, lengths, distances_km = terrain_profiles_yx(max_surface_terrain_profile_samples, tm,
+                                                                      transmitter_yx, receivers_y[batch],
+                                                                      receivers_x[batch], distances_m[batch], pyramid,
+                                                                      stencils=stencils)
+            else:
+                profiles, lengths, distances_km = rays.profiles(max_surface_terrain_profile_samples,
+                                                                receivers_y[batch], receivers_x[batch],
+                                                                distances_m[batch])
+            attenuations_dB = attenuations(backend, profiles, lengths, distances_km, freq_MHz,
+                                           transmitter_height, receiver_height, fractions, lookup_tables)
+            covered[receivers_y[batch], receivers_x[batch]] = attenuations_dB <= max_att_dB
+            progress.update(len(lengths))
     print('Finished calculating coverage')
 
+    return covered, transmitter_marker
+
+
+def run(freq_MHz: float, transmitter_coords: Tuple[float, float],
+        transmitter_height: float, receiver_height: float,
+        max_surface_terrain_profile_samples: int = 600, use_pyramid: bool = False, radial: bool = False,
+        use_stencils: bool = False, backend: str = NUMPY,
+        approximate_prescreen_margin_dB: float | None = None,
+        reliability: float | None = None, confidence: float = 0.5, lookup_tables: bool = False):
+    """Coverage composited over the base render (see coverage_layers for the arguments)."""
+    render, covered, transmitter_marker = coverage_layers(freq_MHz, transmitter_coords, transmitter_height,
+                                                          receiver_height, max_surface_terrain_profile_samples,
+                                                          use_pyramid, radial, use_stencils, backend,
+                                                          approximate_prescreen_margin_dB, reliability, confidence,
+                                                          lookup_tables)
+    terrain_map.render_map.composite(render, covered, terrain_map.render_map.RED, one_third)
+    terrain_map.render_map.composite(render, transmitter_marker, terrain_map.render_map.DEEP_PINK)
+
     return render
 
 
+def coverage_layers(freq_MHz: float, transmitter_coords: Tuple[float, float],
+                    transmitter_height: float, receiver_height: float,
+                    max_surface_terrain_profile_samples: int = 600, use_pyramid: bool = False, radial: bool = False,
+                    use_stencils: bool = False, backend: str = NUMPY,
+                    approximate_prescreen_margin_dB: float | None = None,
+                    reliability: float | None = None, confidence: float = 0.5,
+                    lookup_tables: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns (render, covered, transmitter_marker): the base render of the loaded map and the rasters of
+       calculate_coverage, for callers that keep them as separate layers."""
+    if terrain_map.load_map.loaded_terrain_map is None:
+        tm = terrain_map.load_map.generate()
+    else:
+        tm = terrain_map.load_map.loaded_terrain_map
+    render = terrain_map.render_map.render(tm, draw_roads=True)
+
+    stencil_cache = pathloss.stencils.load() if use_stencils else None
+    covered, transmitter_marker = calculate_coverage(tm, freq_MHz, transmitter_coords,
+                                                     transmitter_height, receiver_height,
+                                                     max_surface_terrain_profile_samples, use_pyramid,
+                                                     stencil_cache, backend, approximate_prescreen_margin_dB,
+                                                     reliability, confidence, radial, lookup_tables)
+    if stencil_cache is not None and stencil_cache.modified:
+        stencil_cache.save()
+
+    return render, covered, transmitter_marker
+
+
 if __name__ == '__main__':
     high = -5.308657, 56.381646
     oban_out = -5.455720, 56.427951
@@ -91,12 +224,22 @@ if __name__ == '__main__':
     transmitter_height = 5
     receiver_height = 300
 
-    img = run(freq_MHz=freq_MHz, transmitter_coords=transmitter,
-              transmitter_height=transmitter_height, receiver_height=receiver_height,
-              max_surface_terrain_profile_samples=100)
+    base, covered, transmitter_marker = coverage_layers(freq_MHz=freq_MHz, transmitter_coords=transmitter,
+                                                        transmitter_height=transmitter_height,
+                                                        receiver_height=receiver_height,
+                                                        max_surface_terrain_profile_samples=100, use_pyramid=True)
+    img = base.copy()
+    terrain_map.render_map.composite(img, covered, terrain_map.render_map.RED, one_third)
+    terrain_map.render_map.composite(img, transmitter_marker, terrain_map.render_map.DEEP_PINK)
     image = Image.fromarray(img, mode="RGB")
     file = defs.OUTPUT_DIRECTORY / ("coverage_f" + str(freq_MHz)
                                     + "_th" + str(transmitter_height)
                                     + "_rh" + str(receiver_height)
                                     + "_coords" + str(transmitter) + ".png")
     image.save(fp=file, format="PNG", optimize=True)
+    # Base map and coverage as separate tile layers, so a viewer can toggle the overlay
+    terrain_map.xyz_tiles.export(image=base, tm=terrain_map.load_map.loaded_terrain_map,
+                                 directory=defs.OUTPUT_DIRECTORY / "tiles" / file.stem / "base")
+    terrain_map.xyz_tiles.export(image=terrain_map.render_map.overlay_rgba(covered, transmitter_marker),
+                                 tm=terrain_map.load_map.loaded_terrain_map,
+                                 directory=defs.OUTPUT_DIRECTORY / "tiles" / file.stem / "coverage")
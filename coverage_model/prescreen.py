@@ -0,0 +1,67 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+from coverage_model.radial import cast_rays
+from pathloss.itm import ITMSession
+from pathloss.itm_geometry import terrain_irregularity
+from terrain_map import TerrainMap, coordinates_distance_array
+
+"""
+Approximate (lossy) coverage pre-screen with ITM's area prediction mode: instead of a profile per receiver, area mode
+only needs the terrain irregularity (delta h) around the transmitter, and gives the median pathloss at any distance.
+It is evaluated once per distance ring (one map square wide) around the transmitter, with delta h estimated from rays
+cast over the local DEM.
+
+Rings whose area mode pathloss is below the maximum allowed attenuation by more than a margin are taken as covered,
+rings above it by more than the margin as uncovered, only the receivers of the rings in between (the band around the
+coverage edge) need point-to-point predictions. Area mode describes the median over all paths at a distance,
+individual paths (behind a hill, across a valley) deviate from it by tens of dB, so this is no bound: receivers
+outside the band are classified without ITM and some of them wrongly, whatever the margin (2% to 14% of them at a
+10 dB margin in tests). The coverage it gives is an approximation of calculate_coverage's, only use it for previews.
+"""
+
+irregularity_rays: int = 36  # Rays over which delta h is estimated
+
+
+def estimate_terrain_irregularity(tm: TerrainMap, transmitter_coords: Tuple[float, float], steps: int) -> float:
+    """Median delta h (meters, as dlthx computes it over a whole profile) of rays from the transmitter,
+       steps map squares long (or up to the map's edge)."""
+    transmitter_yx = tm.coords_to_map_yx(transmitter_coords)
+    ray_y, ray_x, elevations, lengths = cast_rays(tm, transmitter_yx, irregularity_rays, steps)
+    rays = np.flatnonzero(lengths >= 3)
+    if len(rays) == 0:
+        return 0.
+    last = lengths[rays] - 1
+    end_lon, end_lat = tm.map_yx_to_coords_array(ray_y[rays, last], ray_x[rays, last])
+    spacing = coordinates_distance_array(transmitter_coords[0], transmitter_coords[1], end_lon, end_lat) / last
+    dh = terrain_irregularity(elevations[rays], lengths[rays], spacing, np.zeros(len(rays)), last * spacing)
+    return float(np.median(dh))
+
+
+def approximate_classify(tm: TerrainMap, freq_MHz: float, transmitter_coords: Tuple[float, float],
+                         transmitter_height: float, receiver_height: float, distances_m: np.ndarray,
+                         distances_squares: np.ndarray, max_att_dB: float, margin_dB: float) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (covered, ambiguous): boolean arrays over the receivers at distances_m (distances_squares in map
+       squares) from the transmitter: covered being the receivers taken as covered and ambiguous those that need
+       point-to-point predictions (the others are taken as uncovered).
+       Lossy, see the module's description."""
+    if len(distances_m) == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+    num_rings = math.ceil(distances_squares.max()) + 1
+    ring_m = float(np.median(distances_m / distances_squares))
+
+    dh = estimate_terrain_irregularity(tm, transmitter_coords, num_rings)
+    session = ITMSession(freq_MHz, transmitter_height)
+    ring_distances_m = np.arange(1, num_rings + 1) * ring_m
+    ring_att_dB = np.array(session.area(ring_distances_m.tolist(), receiver_height, dh))
+    att_dB = np.interp(distances_m, ring_distances_m, ring_att_dB)
+
+    covered = att_dB <= max_att_dB - margin_dB
+    ambiguous = ~covered & (att_dB < max_att_dB + margin_dB)
+    print('Approximate area mode pre-screen (delta h = ' + str(round(dh, 1)) + 'm, margin = ' + str(margin_dB) + 'dB): '
+          + str(int(covered.sum())) + ' covered, ' + str(int((~covered & ~ambiguous).sum())) + ' uncovered, '
+          + str(int(ambiguous.sum())) + ' ambiguous', flush=True)
+    return covered, ambiguous
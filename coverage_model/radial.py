@@ -0,0 +1,86 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+from pathloss.terrain_module import terrain_profiles_yx
+from terrain_map import TerrainMap
+
+"""
+Radial profile source for coverage_model.calculate_coverage (radial=True): rays are cast once from the transmitter,
+one map square per step, and every receiver's profile is read from the ray closest to its bearing, so receivers on
+the same bearing share the squares between them and the transmitter instead of each sampling its own line.
+
+Profiles have the same layout as pathloss.terrain_module.terrain_profiles_yx (same number of samples, the receiver's
+square first, then samples at n / lengths of the way to the transmitter) and are evaluated by the same batched ITM
+backends. They differ from the straight-line profiles where the nearest ray passes next to a sample's square (at most
+half a square off at the range's edge, more between rays close to the transmitter). Receivers whose ray leaves the map
+before reaching them get their own straight-line profile.
+"""
+
+
+def cast_rays(tm: TerrainMap, transmitter_yx: Tuple[int, int], num_rays: int, steps: int) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Map squares visited by rays at equally spaced bearings: (ray_y, ray_x, elevations, lengths),
+       lengths being the number of samples of each ray inside the map (the transmitter's square is sample 0)."""
+    bearings = 2 * math.pi * np.arange(num_rays) / num_rays
+    k = np.arange(steps + 1)
+    ray_y = np.rint(transmitter_yx[0] + np.sin(bearings)[:, None] * k).astype(np.int64)
+    ray_x = np.rint(transmitter_yx[1] + np.cos(bearings)[:, None] * k).astype(np.int64)
+
+    height, width = tm.shape()
+    inside = np.logical_and.accumulate((0 <= ray_y) & (ray_y < height) & (0 <= ray_x) & (ray_x < width), axis=1)
+    lengths = inside.sum(axis=1)
+    ray_y = np.where(inside, ray_y, transmitter_yx[0])
+    ray_x = np.where(inside, ray_x, transmitter_yx[1])
+    # All rays in one gather, float64 as hzns works in double precision
+    elevations = tm.elevation_at(ray_y, ray_x).astype(np.float64)
+    return ray_y, ray_x, elevations, lengths
+
+
+class Rays:
+    """Rays cast from a transmitter up to steps squares away, and the profiles of receivers read from them."""
+
+    def __init__(self, tm: TerrainMap, transmitter_yx: Tuple[int, int], steps: int):
+        shape = tm.shape()
+        # Rays never need to go further than the farthest corner of the map
+        steps = min(steps, math.ceil(max(math.hypot(corner_y - transmitter_yx[0], corner_x - transmitter_yx[1])
+                                         for corner_y in (0, shape[0] - 1) for corner_x in (0, shape[1] - 1))))
+        self.num_rays = max(8, math.ceil(2 * math.pi * steps))  # About one ray per square on the outermost ring
+        self.tm = tm
+        self.transmitter_yx = transmitter_yx
+        _, _, self.elevations, self.lengths = cast_rays(tm, transmitter_yx, self.num_rays, steps)
+        self.elevations = self.elevations.astype(np.float32)
+
+    def profiles(self, max_samples: int, receivers_y: np.ndarray, receivers_x: np.ndarray, distances_m: np.ndarray) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(profiles, lengths, distances_km) as terrain_profiles_yx returns them, read from the rays."""
+        receivers_y = np.asarray(receivers_y, dtype=np.int64)
+        receivers_x = np.asarray(receivers_x, dtype=np.int64)
+        distances_m = np.asarray(distances_m, dtype=np.float64)
+        lengths = np.maximum(2, np.minimum(min(max_samples, 600), np.ceil(distances_m / 25).astype(np.int64)))
+        if len(lengths) == 0:
+            return np.empty((0, 2), dtype=np.float32), lengths, distances_m / 1e3
+
+        diff_y = receivers_y - self.transmitter_yx[0]
+        diff_x = receivers_x - self.transmitter_yx[1]
+        rays = np.rint(np.arctan2(diff_y, diff_x) / (2 * math.pi) * self.num_rays).astype(np.int64) % self.num_rays
+
+        # Sample n lies n / lengths of the way from the receiver to the transmitter
+        n = np.arange(lengths.max())
+        valid = n < lengths[:, None]
+        steps = np.rint(np.hypot(diff_y, diff_x)[:, None] * (1 - n / lengths[:, None])).astype(np.int64)
+        steps = np.where(valid, steps, 0)
+        on_ray = steps[:, 1:].max(axis=1, initial=0) < self.lengths[rays]
+
+        profiles = np.empty(steps.shape, dtype=np.float32)
+        profiles[on_ray] = self.elevations[rays[on_ray, None], steps[on_ray]]
+        # The receiver's own square, not the ray's closest one, is the ground under its antenna
+        profiles[:, 0] = self.tm.elevation_at(receivers_y, receivers_x)
+        if not on_ray.all():
+            off_ray = np.flatnonzero(~on_ray)
+            own, own_lengths, _ = terrain_profiles_yx(max_samples, self.tm, self.transmitter_yx, receivers_y[off_ray],
+                                                      receivers_x[off_ray], distances_m[off_ray])
+            profiles[off_ray, :own.shape[1]] = own
+        profiles[~valid] = np.nan
+        return profiles, lengths, distances_m / 1e3
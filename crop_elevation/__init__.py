@@ -1,6 +1,10 @@
+from typing import Tuple
+
 import rasterio
+from affine import Affine
 from pyproj import Transformer
 from rasterio.plot import show
+from rasterio.transform import rowcol
 from rasterio.windows import Window
 
 import defintions as defs
@@ -10,25 +14,28 @@ nw_corner = (-5.604909, 56.482382)
 se_corner = (-5.190802, 56.349852)
 
 
-def run(show_cropped: bool = True):
-    with rasterio.open(defs.REPROJECTED_ELEVATION_DATA) as elevation_data:
-        transformer = Transformer.from_crs(crs_from=crs, crs_to=elevation_data.crs, always_xy=True)
-        affine_nw = transformer.transform(nw_corner[0], nw_corner[1])
-        affine_se = transformer.transform(se_corner[0], se_corner[1])
+def bbox_window(transform: Affine, elevation_crs,
+                nw: Tuple[float, float] = nw_corner, se: Tuple[float, float] = se_corner) -> Window:
+    """Window of a raster (given its affine transform and CRS) between two Longitude,Latitude corners."""
+    transformer = Transformer.from_crs(crs_from=crs, crs_to=elevation_crs, always_xy=True)
+    affine_nw = transformer.transform(nw[0], nw[1])
+    affine_se = transformer.transform(se[0], se[1])
 
-        min_y, min_x = elevation_data.index(affine_nw[0], affine_nw[1])
-        max_y, max_x = elevation_data.index(affine_se[0], affine_se[1])
+    min_y, min_x = rowcol(transform, affine_nw[0], affine_nw[1])
+    max_y, max_x = rowcol(transform, affine_se[0], affine_se[1])
 
-        diff_x = max_x - min_x
-        diff_y = max_y - min_y
+    return Window(col_off=min_x, row_off=min_y, width=max_x - min_x, height=max_y - min_y)
 
-        window = Window(col_off=min_x, row_off=min_y, width=diff_x, height=diff_y)
+
+def run(show_cropped: bool = True):
+    with rasterio.open(defs.REPROJECTED_ELEVATION_DATA) as elevation_data:
+        window = bbox_window(elevation_data.transform, elevation_data.crs)
         transform = elevation_data.window_transform(window)
 
         new_profile = elevation_data.profile
         new_profile.update({
-            'width': diff_x,
-            'height': diff_y,
+            'width': window.width,
+            'height': window.height,
             'transform': transform
         })
 
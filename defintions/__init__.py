@@ -14,6 +14,22 @@ REPROJECTED_ELEVATION_DATA = DATA_DIRECTORY / "REPROJECTED.TIF"
 # FINAL (cropped) elevation data
 FINAL_ELEVATION_DATA = DATA_DIRECTORY / "FINAL.TIF"
 
+# Local road graphs (see terrain_map.roads), downloaded once so later runs work offline
+ROAD_DATA_DIRECTORY = DATA_DIRECTORY / "roads"
+
+# Cache of generated TerrainMaps (see terrain_map.cache)
+CACHE_DIRECTORY = DATA_DIRECTORY / "cache"
+TERRAIN_CACHE_DIRECTORY = CACHE_DIRECTORY / "terrain"
+
+# Ray stencils for terrain profile sampling (see pathloss.stencils)
+STENCIL_CACHE_FILE = CACHE_DIRECTORY / "stencils.npz"
+
+# Lookup tables of ITM's attenuation functions (see pathloss.itm_tables)
+ITM_TABLES_CACHE_FILE = CACHE_DIRECTORY / "itm_tables.npz"
+
+# Elevation data extracted for areas of interest (see terrain_map.aoi)
+AOI_CACHE_DIRECTORY = CACHE_DIRECTORY / "aoi"
+
 # CRS used for processing in project (all data is converted to this before processing)
 PROJECT_CRS = "EPSG:3857"
 
@@ -1,15 +1,25 @@
+import cmath
+import copy
+import functools
 import math
-from typing import Tuple
-
-import numpy as np
+from typing import List, Tuple
 
 import terrain_map.load_map
-from pathloss import terrain_module
+from pathloss import itm_jit, terrain_module
+from pathloss.itmlogic.misc.log import log
+from pathloss.itmlogic.misc.qerfi import qerfi
+from pathloss.itmlogic.lrprop import lrprop
+from pathloss.itmlogic.preparatory_subroutines.qlra import qlra
 from pathloss.itmlogic.preparatory_subroutines.qlrpfl import qlrpfl
-from terrain_map import TerrainMap
+from pathloss.itmlogic.prop import Prop
+from pathloss.itmlogic.statistics.avar import avar, climate_coefficients
+from terrain_map import GeoreferencedMap
+
+PYTHON = "python"  # itmlogic, the reference implementation
+NUMBA = "numba"  # pathloss.itm_jit, falls back to PYTHON when Numba is not installed
 
 
-def itm(terrain: TerrainMap,
+def itm(terrain: GeoreferencedMap,
         freq_MHz: float,
         transmitter_coords: Tuple[float, float], receiver_coords: Tuple[float, float],
         transmitter_height: float, receiver_height: float,
@@ -17,15 +27,18 @@ def itm(terrain: TerrainMap,
         vertical_polarization: bool = False,
         terrain_relative_permittivity: float = 15,
         terrain_conductivity: float = 0.005,
-        climate: int = 6
+        climate: int = 6,
+        use_pyramid: bool = False,
+        backend: str = PYTHON,
+        lookup_tables: bool = False
         ) -> float:
     """
         Run itmlogic in point to point (p2p) prediction mode.
 
         Parameters
         ----------
-        terrain : TerrainMap
-            The TerrainMap containing elevation data
+        terrain : GeoreferencedMap
+            The TerrainMap (or TiledTerrainMap) containing elevation data
         freq_MHz : float
             Radio frequency (in MHz)
         transmitter_coords : Tuple[float, float]
@@ -47,6 +60,14 @@ def itm(terrain: TerrainMap,
         climate : int
             Climate type: 1=equatorial, 2=continental subtropical, 3=maritime subtropical, 4=desert,
             5=continental temperate, 6=maritime temperate overland, 7=maritime temperate oversea (5 is the default)
+        use_pyramid : bool
+            Raise profile samples to the highest square the path crosses around them (see terrain_module.terrain_p2p_yx)
+        backend : str
+            PYTHON (itmlogic) or NUMBA (the compiled kernels of pathloss.itm_jit, same results to 1e-9 dB),
+            NUMBA runs itmlogic when Numba is not installed
+        lookup_tables : bool
+            Evaluate aknfe, fht, h0f and ahd from the interpolated tables of pathloss.itm_tables instead of their
+            formulas (up to 3e-4 dB error per function), NUMBA then runs itmlogic
 
         Returns
         -------
@@ -55,108 +76,254 @@ def itm(terrain: TerrainMap,
             (includes the free space loss)
         """
 
-    # Define a dict for model parameters
-    parameters = {'fmhz': freq_MHz,
-                  'hg': [transmitter_height, receiver_height],
-                  'eps': terrain_relative_permittivity,
-                  'sgm': terrain_conductivity,
-                  'klim': climate}
-
-    # Polarization selection (0=horizontal, 1=vertical)
-    if vertical_polarization:
-        parameters['ipol'] = 1
-    else:
-        parameters['ipol'] = 0
-
-    # Surface refractivity (N-units): also controls effective Earth radius
-    parameters['ens0'] = 314
-
     measured_terrain_profile, distance_km = terrain_module.terrain_p2p(max_samples, terrain,
-                                                                       transmitter_coords, receiver_coords)
-
-    parameters['d'] = distance_km
+                                                                       transmitter_coords, receiver_coords,
+                                                                       use_pyramid)
+
+    return itm_p2p(measured_terrain_profile=measured_terrain_profile,
+                   distance_km=distance_km,
+                   freq_MHz=freq_MHz,
+                   transmitter_height=transmitter_height,
+                   receiver_height=receiver_height,
+                   vertical_polarization=vertical_polarization,
+                   terrain_relative_permittivity=terrain_relative_permittivity,
+                   terrain_conductivity=terrain_conductivity,
+                   climate=climate,
+                   backend=backend,
+                   lookup_tables=lookup_tables)
+
+
+def itm_p2p(measured_terrain_profile: List[float],
+            distance_km: float,
+            freq_MHz: float,
+            transmitter_height: float, receiver_height: float,
+            vertical_polarization: bool = False,
+            terrain_relative_permittivity: float = 15,
+            terrain_conductivity: float = 0.005,
+            climate: int = 6,
+            backend: str = PYTHON,
+            lookup_tables: bool = False
+            ) -> float:
+    """
+        Run itmlogic in point to point (p2p) prediction mode on an already extracted terrain profile
+        (see pathloss.terrain_module), the other parameters are the same as itm.
+        To predict many paths from the same transmitter, build an ITMSession once instead.
 
-    # Number of points describing profile -1
-    pfl = [len(measured_terrain_profile) - 1, 0]
+        Parameters
+        ----------
+        measured_terrain_profile : List[float]
+            Equally spaced surface elevations (meters) between the two antennas
+        distance_km : float
+            Distance in kilometers between the antennas
 
-    for profile in measured_terrain_profile:
-        pfl.append(profile)
+        Returns
+        -------
+        output : float
+            Pathloss in dB (see itm)
+        """
 
-    # Refractivity scaling ens=ens0*exp(-zsys/9460.)
-    # (Average system elev above sea level)
-    zsys = 0
+    session = _session(freq_MHz, transmitter_height, vertical_polarization, terrain_relative_permittivity,
+                       terrain_conductivity, climate, backend, lookup_tables)
 
-    # Note also defaults to a continental temperate climate
+    return session.p2p(measured_terrain_profile, distance_km, receiver_height)
 
-    # Setup some intermediate quantities
-    # Initial values for AVAR control parameter: LVAR=0 for quantile change,
-    # 1 for dist change, 2 for HE change, 3 for WN change, 4 for MDVAR change,
-    # 5 for KLIM change
-    parameters['lvar'] = 5
 
-    # Inverse Earth radius
-    parameters['gma'] = 157E-9
+@functools.lru_cache(maxsize=64)
+def _session(freq_MHz: float, transmitter_height: float, vertical_polarization: bool,
+             terrain_relative_permittivity: float, terrain_conductivity: float, climate: int,
+             backend: str, lookup_tables: bool) -> 'ITMSession':
+    """ITMSession of itm_p2p's parameters, kept for the next calls with the same ones (p2p only copies its template)."""
+    return ITMSession(freq_MHz=freq_MHz,
+                      transmitter_height=transmitter_height,
+                      vertical_polarization=vertical_polarization,
+                      terrain_relative_permittivity=terrain_relative_permittivity,
+                      terrain_conductivity=terrain_conductivity,
+                      climate=climate,
+                      backend=backend,
+                      lookup_tables=lookup_tables)
 
-    # Profile range step, select option here to define range step from profile
-    # length and # of points
-    xkm = 0
 
-    # If XKM is <=0, define range step by taking the profile length/number
-    # of points in profile
-    if xkm <= 0:
-        xkm = parameters['d'] // pfl[0]
+class ITMSession:
+    """
+        The per-run part of itm_p2p: everything that only depends on the frequency, polarization, ground constants,
+        climate and transmitter (wave number, refractivity, effective earth curvature, surface impedance and the
+        climate's variability coefficients) is set up once, on a template Prop that each path copies.
+        Gives the same results as itm_p2p. With vectorized_geometry, the PYTHON backend prepares each path with the
+        array routines of pathloss.itm_geometry, which pays off for long profiles (above roughly 1000 samples).
+        With lookup_tables, the attenuation functions are read from the tables of pathloss.itm_tables (see itm),
+        by the PYTHON backend.
+        """
 
-        # Range step in meters stored in PFL(2)
-        pfl[1] = parameters['d'] * 1000 / pfl[0]
+    def __init__(self, freq_MHz: float, transmitter_height: float,
+                 vertical_polarization: bool = False,
+                 terrain_relative_permittivity: float = 15,
+                 terrain_conductivity: float = 0.005,
+                 climate: int = 6,
+                 backend: str = PYTHON,
+                 vectorized_geometry: bool = False,
+                 lookup_tables: bool = False):
+        self.freq_MHz = freq_MHz
+        self.transmitter_height = transmitter_height
+        self.vertical_polarization = vertical_polarization
+        self.terrain_relative_permittivity = terrain_relative_permittivity
+        self.terrain_conductivity = terrain_conductivity
+        self.backend = backend
+        self.vectorized_geometry = vectorized_geometry
+        self.lookup_tables = lookup_tables
+
+        # Model parameters
+        prop = Prop(fmhz=freq_MHz,
+                    hg=[transmitter_height, 0.],
+                    eps=terrain_relative_permittivity,
+                    sgm=terrain_conductivity,
+                    klim=climate)
+
+        # Polarization selection (0=horizontal, 1=vertical)
+        if vertical_polarization:
+            prop.ipol = 1
+        else:
+            prop.ipol = 0
+
+        # Surface refractivity (N-units): also controls effective Earth radius
+        prop.ens0 = 314
+
+        # Refractivity scaling ens=ens0*exp(-zsys/9460.)
+        # (Average system elev above sea level)
+        zsys = 0
+
+        # Inverse Earth radius
+        prop.gma = 157E-9
 
-        # Store profile in prop variable
-        parameters['pfl'] = pfl
         # Zero out error flag
-        parameters['kwx'] = 0
+        prop.kwx = 0
         # Initialize omega_n quantity
-        parameters['wn'] = parameters['fmhz'] / 47.7
+        prop.wn = prop.fmhz / 47.7
         # Initialize refractive index properties
-        parameters['ens'] = parameters['ens0']
+        prop.ens = prop.ens0
 
-    # Scale this appropriately if zsys set by user
-    if zsys != 0:
-        parameters['ens'] = parameters['ens'] * math.exp(-zsys / 9460)
+        # Scale this appropriately if zsys set by user
+        if zsys != 0:
+            prop.ens = prop.ens * math.exp(-zsys / 9460)
 
-    # Include refraction in the effective Earth curvature parameter
-    parameters['gme'] = parameters['gma'] * (1 - 0.04665 * math.exp(parameters['ens'] / 179.3))
+        # Include refraction in the effective Earth curvature parameter
+        prop.gme = prop.gma * (1 - 0.04665 * math.exp(prop.ens / 179.3))
 
-    # Set surface impedance Zq parameter
-    zq = complex(parameters['eps'], 376.62 * parameters['sgm'] / parameters['wn'])
+        # Set surface impedance Zq parameter
+        zq = complex(prop.eps, 376.62 * prop.sgm / prop.wn)
 
-    # Set Z parameter (h pol)
-    parameters['zgnd'] = np.sqrt(zq - 1)
+        # Set Z parameter (h pol)
+        prop.zgnd = cmath.sqrt(zq - 1)
 
-    # Set Z parameter (v pol)
-    if parameters['ipol'] != 0:
-        parameters['zgnd'] = parameters['zgnd'] / zq
+        # Set Z parameter (v pol)
+        if prop.ipol != 0:
+            prop.zgnd = prop.zgnd / zq
 
-    # Flag to tell qlrpfl to set prop.klim=prop.klimx and set lvar to initialize avar routine
-    parameters['klimx'] = 0
+        # Climate coefficients of the avar routine, set here once so the
+        # control parameter only asks avar for the path dependent steps:
+        # LVAR=0 for quantile change, 1 for dist change, 2 for HE change,
+        # 3 for WN change, 4 for MDVAR change, 5 for KLIM change
+        prop = climate_coefficients(prop)
+        prop.lvar = 4
 
-    # Flag to tell qlrpfl to use prop.mdvar=prop.mdvarx and set lvar to initialize avar routine
-    parameters['mdvarx'] = 11
+        # Flag to tell qlrpfl to set prop.klim=prop.klimx and set lvar to initialize avar routine
+        prop.klimx = 0
 
-    # Initialization routine for point-to-point mode that sets additional parameters
-    # of prop structure
-    parameters = qlrpfl(parameters)
-    # Here HE = effective antenna heights, DL = horizon distances,
-    # THE = horizon elevation angles
-    # MDVAR = mode of variability calculation: 0=single message mode,
-    # 1=accidental mode, 2=mobile mode, 3 =broadcast mode, +10 =point-to-point,
-    # +20=interference
+        # Flag to tell qlrpfl to use prop.mdvar=prop.mdvarx and set lvar to initialize avar routine
+        prop.mdvarx = 11
 
-    # Conversion factor to db
-    db = 8.685890
+        # Flag to tell adiff and ascat to read their attenuation functions from pathloss.itm_tables
+        prop.lookup_tables = lookup_tables
 
-    # Free space loss in db
-    fs = db * np.log(2 * parameters['wn'] * parameters['dist'])
+        self.template = prop
 
-    return fs + parameters['aref']
+    def prop(self, measured_terrain_profile: List[float], distance_km: float, receiver_height: float) -> Prop:
+        """The path's Prop, ready for qlrpfl: a copy of the template with the profile and receiver height."""
+        prop = copy.copy(self.template)
+        prop.hg = [self.transmitter_height, receiver_height]
+        prop.d = distance_km
+
+        # Number of points describing profile -1, range step in meters
+        pfl = [len(measured_terrain_profile) - 1, 0]
+        pfl.extend(measured_terrain_profile)
+        pfl[1] = prop.d * 1000 / pfl[0]
+        prop.pfl = pfl
+
+        return prop
+
+    def p2p(self, measured_terrain_profile: List[float], distance_km: float, receiver_height: float,
+            fractions: Tuple[float, float, float] | None = None) -> float:
+        """
+            Pathloss in dB of one path from the session's transmitter (see itm_p2p for the parameters),
+            or with fractions of time, locations and situations (e.g. (0.9, 0.5, 0.5) for 90% reliability
+            at 50% confidence), its quantile as given by avar (computed by the PYTHON backend)
+            """
+        if self.backend == NUMBA and itm_jit.AVAILABLE and fractions is None and not self.lookup_tables:
+            return itm_jit.itm_p2p(measured_terrain_profile, distance_km, self.freq_MHz,
+                                   self.transmitter_height, receiver_height, self.vertical_polarization,
+                                   self.terrain_relative_permittivity, self.terrain_conductivity)
+
+        # Initialization routine for point-to-point mode that sets additional parameters
+        # of prop structure
+        prop = qlrpfl(self.prop(measured_terrain_profile, distance_km, receiver_height),
+                      self.vectorized_geometry)
+        # Here HE = effective antenna heights, DL = horizon distances,
+        # THE = horizon elevation angles
+        # MDVAR = mode of variability calculation: 0=single message mode,
+        # 1=accidental mode, 2=mobile mode, 3 =broadcast mode, +10 =point-to-point,
+        # +20=interference
+
+        # Conversion factor to db
+        db = 8.685890
+
+        # Free space loss in db
+        fs = db * log(2 * prop.wn * prop.dist)
+
+        if fractions is not None:
+            # Standard normal deviates of the fractions, and attenuation at them
+            zt, zl, zc = qerfi(fractions).tolist()
+            avar1, prop = avar(zt, zl, zc, prop)
+            return fs + avar1
+
+        return fs + prop.aref
+
+    def area(self, distances_m: List[float], receiver_height: float, terrain_irregularity: float,
+             siting: Tuple[int, int] = (0, 0)) -> List[float]:
+        """
+            Run itmlogic in area prediction mode: the median pathloss (free space loss and reference attenuation, as
+            p2p returns) at each distance from the session's transmitter, over terrain of the given irregularity
+            instead of a profile.
+
+            Parameters
+            ----------
+            distances_m : List[float]
+                Distances in meters from the transmitter, preferably increasing
+            receiver_height : float
+                Receiver's height above ground level
+            terrain_irregularity : float
+                Interdecile range of the terrain elevations (delta h, meters), as dlthx estimates it from a profile
+            siting : Tuple[int, int]
+                Siting criteria of the transmitter and receiver: 0 = random, 1 = with care, 2 = with great care
+
+            Returns
+            -------
+            output : List[float]
+                Pathloss in dB at each distance
+            """
+        prop = copy.copy(self.template)
+        prop.hg = [self.transmitter_height, receiver_height]
+        prop.dh = terrain_irregularity
+        # Sets the effective heights and horizons from the terrain irregularity, lrprop then continues
+        # the area mode from one distance to the next
+        prop = qlra(siting, prop)
+
+        # Conversion factor to db
+        db = 8.685890
+
+        output = []
+        for d in distances_m:
+            prop = lrprop(d, prop)
+            output.append(db * log(2 * prop.wn * d) + prop.aref)
+        return output
 
 
 # Example test
@@ -0,0 +1,211 @@
+import numpy as np
+
+"""
+Array versions of itmlogic's preparatory subroutines (hzns, zlsq1, dlthx with qtile, and qlrpfl.profile_geometry)
+for a batch of terrain profiles: (paths, samples) arrays padded after each path's length, as returned by
+pathloss.terrain_module.terrain_profiles_yx. A single profile is a batch of one (profile[np.newaxis]).
+
+- hzns: the horizon is the running maximum of the elevation angle seen from each antenna, taken with a max/argmax
+  over the whole profile instead of updating the angle sample by sample.
+- zlsq1: the least squares sums are masked sums over the fitted samples.
+- dlthx: the profile is resampled by interpolation at all positions at once, and the two deciles picked with an O(n)
+  np.partition instead of two full sorts (qtile).
+
+The itmlogic quirks are kept: hzns only searches the receiver-side horizon from the first transmitter-side
+obstruction on, dlthx leaves the last resampled point out of the deciles, and profile_geometry takes the receiver's
+ground from the second to last sample in the line of sight case. Results match the scalar routines up to floating
+point reassociation (about 1e-12 relative).
+"""
+
+
+def horizons(profiles: np.ndarray, lengths: np.ndarray, spacing: np.ndarray, hg0, hg1, gme: float):
+    """hzns: horizon angles and distances (the0, the1, dl0, dl1) of every path."""
+    paths, samples = profiles.shape
+    rows = np.arange(paths)
+    last = lengths - 1
+    dist = last * spacing
+    za = profiles[:, 0] + hg0
+    zb = profiles[rows, last] + hg1
+    qc = 0.5 * gme
+    q = qc * dist
+    the1 = (zb - za) / dist
+    the0 = the1 - q
+    the1 = -the1 - q
+
+    # Distances from both antennas of the inner samples (hzns' sa and sb, accumulated the same way)
+    steps = np.broadcast_to(spacing[:, np.newaxis], (paths, samples - 1))
+    sa = np.concatenate((np.zeros((paths, 1)), np.cumsum(steps, axis=1)), axis=1)
+    sb = np.cumsum(np.concatenate((dist[:, np.newaxis], -steps), axis=1), axis=1)
+    index = np.arange(samples)
+    inner = (index > 0) & (index < last[:, np.newaxis])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angles0 = np.where(inner, (profiles - za[:, np.newaxis]) / sa - qc * sa, -np.inf)
+        angles1 = np.where(inner, (profiles - zb[:, np.newaxis]) / sb - qc * sb, -np.inf)
+
+    # Transmitter side: the first maximum, if it is above the straight line to the receiver
+    above = angles0 > the0[:, np.newaxis]
+    obstructed = above.any(axis=1)
+    horizon0 = np.argmax(angles0, axis=1)
+    dl0 = np.where(obstructed, sa[rows, horizon0], dist)
+    the0 = np.where(obstructed, angles0[rows, horizon0], the0)
+
+    # Receiver side: only searched from the first sample above the straight line on
+    angles1 = np.where(index >= np.argmax(above, axis=1)[:, np.newaxis], angles1, -np.inf)
+    horizon1 = np.argmax(angles1, axis=1)
+    obstructed = obstructed & (angles1[rows, horizon1] > the1)
+    dl1 = np.where(obstructed, sb[rows, horizon1], dist)
+    the1 = np.where(obstructed, angles1[rows, horizon1], the1)
+
+    return the0, the1, dl0, dl1
+
+
+def least_squares(values: np.ndarray, xn: np.ndarray, spacing: np.ndarray, x1: np.ndarray, x2: np.ndarray):
+    """zlsq1: heights (z0, zn) at both ends of the straight line fitted to values between the distances x1 and x2,
+       values being xn + 1 equally spaced samples (padded to the batch's width)."""
+    rows = np.arange(len(values))
+    xa = np.trunc(np.maximum(x1 / spacing, 0)).astype(np.int64)
+    xb = xn - np.trunc(np.maximum(xn - x2 / spacing, 0)).astype(np.int64)
+
+    empty = xb <= xa
+    xa = np.where(empty, np.maximum(xa - 1, 0), xa)
+    xb = np.where(empty, xn - np.maximum(xn - xb + 1, 0), xb)
+
+    ja = xa
+    jb = xb
+    xa = xb - xa
+    x = -0.5 * xa
+    xb = xb + x
+
+    index = np.arange(values.shape[1])
+    inner = (index > ja[:, np.newaxis]) & (index < jb[:, np.newaxis])
+    offsets = x[:, np.newaxis] + (index - ja[:, np.newaxis])
+    a = 0.5 * (values[rows, ja] + values[rows, jb]) + np.where(inner, values, 0).sum(axis=1)
+    b = 0.5 * (values[rows, ja] - values[rows, jb]) * x + np.where(inner, values * offsets, 0).sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.where(xa != 0, a / xa, 0)
+        b = b * 12 / ((xa * xa + 2) * xa)
+
+    return a - b * xb, a + (b * (xn - xb))
+
+
+def deciles_range(values: np.ndarray, lengths: np.ndarray, ka: np.ndarray) -> np.ndarray:
+    """qtile(a, ka - 1) - qtile(a, kb - 2) as dlthx uses it, a being the first lengths - 1 values of each row
+       (kb = lengths - ka + 1), with one np.partition per group of rows with the same ka."""
+    output = np.empty(len(values))
+    for k in np.unique(ka).tolist():
+        group = np.flatnonzero(ka == k)
+        # dlthx's n is 10 * ka - 5, so all rows of a group have the same length
+        n = int(lengths[group[0]])
+        # Descending index ka - 1 is ascending index n - 1 - ka, descending index kb - 2 is ascending index ka - 1
+        selected = np.partition(values[group, :n - 1], (k - 1, n - 1 - k), axis=1)
+        output[group] = selected[:, n - 1 - k] - selected[:, k - 1]
+    return output
+
+
+def terrain_irregularity(profiles: np.ndarray, lengths: np.ndarray, spacing: np.ndarray,
+                         x1: np.ndarray, x2: np.ndarray) -> np.ndarray:
+    """dlthx: interdecile range of the (detrended) elevations between the distances x1 and x2 of every path."""
+    last = lengths - 1
+    xa = x1 / spacing
+    xb = x2 / spacing
+    dh = np.zeros(len(profiles))
+    paths = np.flatnonzero((xb - xa) >= 2)
+    if len(paths) == 0:
+        return dh
+    profiles, last, x1, x2, xa, xb = profiles[paths], last[paths], x1[paths], x2[paths], xa[paths], xb[paths]
+
+    ka = np.trunc(0.1 * (xb - xa + 8)).astype(np.int64)
+    ka = np.minimum(np.maximum(4, ka), 25)
+    n = 10 * ka - 5
+    sn = n - 1
+    step = (xb - xa) / sn
+
+    # Resampling: sample j is interpolated at xa + j * step from the profile samples k - 1 and k around it
+    # (dlthx walks k forward from int(xa + 1), never past the last sample)
+    j = np.arange(int(n.max()))
+    position = xa[:, np.newaxis] + j * step[:, np.newaxis]
+    k = np.minimum(np.maximum(np.ceil(position).astype(np.int64), np.trunc(xa + 1).astype(np.int64)[:, np.newaxis]),
+                   last[:, np.newaxis])
+    after = np.take_along_axis(profiles, k, axis=1)
+    before = np.take_along_axis(profiles, k - 1, axis=1)
+    s = np.where(j < n[:, np.newaxis], after + (after - before) * (position - k), np.nan)
+
+    # Detrending by the least squares line through all resampled points
+    sa, sb = least_squares(s, sn, np.ones(len(s)), np.zeros(len(s)), sn.astype(np.float64))
+    s = s - (sa[:, np.newaxis] + j * ((sb - sa) / sn)[:, np.newaxis])
+
+    dh[paths] = deciles_range(s, n, ka) / (1 - 0.8 * np.exp(-(x2 - x1) / 50e3))
+    return dh
+
+
+def profile_geometry(profiles: np.ndarray, lengths: np.ndarray, distances_km: np.ndarray, hg0, hg1,
+                     gme: float) -> dict:
+    """qlrpfl.profile_geometry: path geometry (dist, the0, the1, dl0, dl1, dh, he0, he1) of every path as arrays."""
+    rows = np.arange(len(profiles))
+    profiles = np.asarray(profiles, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    last = lengths - 1
+    hg0 = np.broadcast_to(np.asarray(hg0, dtype=np.float64), (len(rows),))
+    hg1 = np.broadcast_to(np.asarray(hg1, dtype=np.float64), (len(rows),))
+    spacing = np.asarray(distances_km, dtype=np.float64) * 1000 / last
+    dist = last * spacing
+
+    the0, the1, dl0, dl1 = horizons(profiles, lengths, spacing, hg0, hg1, gme)
+
+    xl0 = np.minimum(15 * hg0, 0.1 * dl0)
+    xl1 = dist - np.minimum(15 * hg1, 0.1 * dl1)
+
+    dh = terrain_irregularity(profiles, lengths, spacing, xl0, xl1)
+
+    # Line of sight (or nearly): effective heights above the terrain fitted between both horizons
+    za, zb = least_squares(profiles, last, spacing, xl0, xl1)
+    los_he0 = hg0 + np.maximum(profiles[:, 0] - za, 0)
+    los_he1 = hg1 + np.maximum(profiles[rows, np.maximum(last - 1, 0)] - zb, 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        los_dl1 = np.sqrt(2 * los_he1 / gme) * np.exp(-0.07 * np.sqrt(dh / np.maximum(los_he1, 5)))
+        q = dl0 + los_dl1
+        scale = q <= dist
+        los_he1 = np.where(scale, los_he1 * (dist / q) ** 2, los_he1)
+        los_dl1 = np.where(scale, np.sqrt(2 * los_he1 / gme) * np.exp(-0.07 * np.sqrt(dh / np.maximum(los_he1, 5))),
+                           los_dl1)
+
+        q = np.sqrt(2 * los_he0 / gme)
+        los_the0 = (0.65 * dh * (q / dl0 - 1) - 2 * los_he0) / q
+        q = np.sqrt(2 * los_he1 / gme)
+        los_the1 = (0.65 * dh * (q / los_dl1 - 1) - 2 * los_he1) / q
+
+    # Transhorizon: effective heights above the terrain fitted in front of each antenna
+    za, _ = least_squares(profiles, last, spacing, xl0, 0.9 * dl0)
+    _, zb = least_squares(profiles, last, spacing, dist - 0.9 * dl1, xl1)
+    he0 = hg0 + np.maximum(profiles[:, 0] - za, 0)
+    he1 = hg1 + np.maximum(profiles[rows, last] - zb, 0)
+
+    los = dl0 + dl1 >= 1.5 * dist
+    return {'dist': dist,
+            'the0': np.where(los, los_the0, the0),
+            'the1': np.where(los, los_the1, the1),
+            'dl0': dl0,
+            'dl1': np.where(los, los_dl1, dl1),
+            'dh': dh,
+            'he0': np.where(los, los_he0, he0),
+            'he1': np.where(los, los_he1, he1)}
+
+
+def prop_geometry(prop):
+    """
+    Array version of qlrpfl.profile_geometry for one path: sets dist, the, dl, dh and he of the Prop from its
+    profile (pfl) and antenna heights (hg). The scalar routines are faster for short profiles.
+    """
+    pfl = prop.pfl
+    profile = np.array(pfl[2:], dtype=np.float64)[np.newaxis]
+    geometry = profile_geometry(profile, np.array([len(pfl) - 2]), np.array([pfl[0] * pfl[1] / 1000]),
+                                prop.hg[0], prop.hg[1], prop.gme)
+    prop.dist = pfl[0] * pfl[1]
+    prop.the = [float(geometry['the0'][0]), float(geometry['the1'][0])]
+    prop.dl = [float(geometry['dl0'][0]), float(geometry['dl1'][0])]
+    prop.dh = float(geometry['dh'][0])
+    prop.he = [float(geometry['he0'][0]), float(geometry['he1'][0])]
+    return prop
@@ -0,0 +1,508 @@
+import cmath
+import math
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # Optional dependency, pathloss.itm falls back to the pure Python itmlogic without it
+    numba = None
+
+"""
+JIT-compiled (Numba) ITM point-to-point kernels: the whole chain of itm_p2p (hzns, dlthx/zlsq1/qtile, lrprop with
+adiff, alos and ascat) ported to typed scalar code and compiled to machine code on first use (cached on disk).
+
+The kernels follow the itmlogic routines line by line, including their quirks (dlthx's s[2:-1] deciles, hzns only
+searching the receiver-side horizon after a transmitter-side obstruction, lrprop's always-true wq tuple), and match
+them to within 1e-9 dB. Selected with backend=NUMBA on pathloss.itm.itm/itm_p2p and coverage_model.run,
+AVAILABLE tells whether Numba is installed.
+"""
+
+AVAILABLE = numba is not None
+
+
+def _jit(function):
+    if numba is None:
+        return function
+    # error_model='numpy': division by zero gives inf/nan like the numpy scalars of the reference instead of raising
+    return numba.njit(cache=True, error_model='numpy')(function)
+
+
+@_jit
+def _log(x):
+    if x > 0:
+        return math.log(x)
+    if x == 0:
+        return -math.inf
+    return math.nan
+
+
+@_jit
+def _hzns(pfl, dist, hg0, hg1, gme):
+    np_ = int(pfl[0])
+    xi = pfl[1]
+    za = pfl[2] + hg0
+    zb = pfl[np_ + 2] + hg1
+    qc = 0.5 * gme
+    q = qc * dist
+    the1 = (zb - za) / dist
+    the0 = the1 - q
+    the1 = -the1 - q
+    dl0 = dist
+    dl1 = dist
+
+    if np_ >= 2:
+        sa = 0.
+        sb = dist
+        wq = True
+        for i in range(2, np_ + 1):
+            sa = sa + xi
+            sb = sb - xi
+            q = pfl[i + 1] - (qc * sa + the0) * sa - za
+            if q > 0:
+                the0 = the0 + q / sa
+                dl0 = sa
+                wq = False
+            if not wq:
+                q = pfl[i + 1] - (qc * sb + the1) * sb - zb
+                if q > 0:
+                    the1 = the1 + q / sb
+                    dl1 = sb
+
+    return the0, the1, dl0, dl1
+
+
+@_jit
+def _zlsq1(z, x1, x2):
+    xn = int(z[0])
+    xa = int(max(x1 / z[1], 0))
+    xb = xn - int(max(xn - x2 / z[1], 0))
+
+    if xb <= xa:
+        xa = max(xa - 1, 0)
+        xb = xn - max(xn - xb + 1, 0)
+
+    ja = xa
+    jb = xb
+    n = jb - ja
+    xa = xb - xa
+    x = -0.5 * xa
+    xb = xb + x
+
+    a = 0.5 * (z[ja + 2] + z[jb + 2])
+    b = 0.5 * (z[ja + 2] - z[jb + 2]) * x
+
+    for i in range(2, n + 1):
+        ja = ja + 1
+        x = x + 1
+        a = a + z[ja + 2]
+        b = b + z[ja + 2] * x
+
+    a = a / xa if xa else 0.
+    b = b * 12 / ((xa * xa + 2) * xa)
+
+    return a - b * xb, a + (b * (xn - xb))
+
+
+@_jit
+def _qtile(a, ir):
+    return np.sort(a)[::-1][ir]
+
+
+@_jit
+def _dlthx(pfl1, x1, x2):
+    np_ = int(pfl1[0])
+    xa = x1 / pfl1[1]
+    xb = x2 / pfl1[1]
+    dlthx1 = 0.
+
+    if (xb - xa) >= 2:
+        ka = int(0.1 * (xb - xa + 8))
+        ka = min(max(4, ka), 25)
+        n = 10 * ka - 5
+        kb = n - ka + 1
+        sn = n - 1
+        s = np.empty(n + 2)
+        s[0] = sn
+        s[1] = 1
+        xb = (xb - xa) / sn
+        k = int(xa + 1)
+        xa = xa - k
+
+        for j in range(1, n + 1):
+            while xa > 0 and k < np_:
+                xa = xa - 1
+                k = k + 1
+            if k + 2 < len(pfl1):
+                s[j + 1] = pfl1[k + 2] + (pfl1[k + 2] - pfl1[k + 1]) * xa
+            else:
+                s[j + 1] = pfl1[len(pfl1) - 1] + (pfl1[len(pfl1) - 1] - pfl1[len(pfl1) - 2]) * xa
+            xa = xa + xb
+
+        xa, xb = _zlsq1(s, 0, sn)
+        xb = (xb - xa) / sn
+
+        for j in range(0, n):
+            s[j + 2] = s[j + 2] - xa
+            xa = xa + xb
+
+        dlthx1 = _qtile(s[2:-1], ka - 1) - _qtile(s[2:-1], kb - 2)
+        dlthx1 = dlthx1 / (1 - 0.8 * math.exp(-(x2 - x1) / 50e3))
+
+    return dlthx1
+
+
+@_jit
+def _profile_geometry(pfl, hg0, hg1, gme):
+    """qlrpfl.profile_geometry, returns (dist, the0, the1, dl0, dl1, dh, he0, he1)."""
+    dist = pfl[0] * pfl[1]
+    np_ = int(pfl[0])
+    the0, the1, dl0, dl1 = _hzns(pfl, dist, hg0, hg1, gme)
+
+    xl0 = min(15 * hg0, 0.1 * dl0)
+    xl1 = dist - min(15 * hg1, 0.1 * dl1)
+
+    dh = _dlthx(pfl, xl0, xl1)
+
+    if dl0 + dl1 >= 1.5 * dist:
+        za, zb = _zlsq1(pfl, xl0, xl1)
+        he0 = hg0 + max(pfl[2] - za, 0)
+        he1 = hg1 + max(pfl[np_ + 1] - zb, 0)
+
+        dl1 = math.sqrt(2 * he1 / gme) * math.exp(-0.07 * math.sqrt(dh / max(he1, 5)))
+
+        q = dl0 + dl1
+        if q <= dist:
+            q = (dist / q) ** 2
+            he1 = he1 * q
+            dl1 = math.sqrt(2 * he1 / gme) * math.exp(-0.07 * math.sqrt(dh / max(he1, 5)))
+
+        q = math.sqrt(2 * he0 / gme)
+        the0 = (0.65 * dh * (q / dl0 - 1) - 2 * he0) / q
+        q = math.sqrt(2 * he1 / gme)
+        the1 = (0.65 * dh * (q / dl1 - 1) - 2 * he1) / q
+    else:
+        za, q = _zlsq1(pfl, xl0, 0.9 * dl0)
+        q, zb = _zlsq1(pfl, dist - 0.9 * dl1, xl1)
+        he0 = hg0 + max(pfl[2] - za, 0)
+        he1 = hg1 + max(pfl[np_ + 2] - zb, 0)
+
+    return dist, the0, the1, dl0, dl1, dh, he0, he1
+
+
+@_jit
+def _aknfe(v2):
+    if v2 < 5.76:
+        if v2 <= 0:
+            v2 = 0.00001
+        return 6.02 + 9.11 * math.sqrt(v2) - 1.27 * v2
+    return 12.953 + 4.343 * _log(v2)
+
+
+@_jit
+def _fht(x, pk):
+    if x < 200:
+        w = -_log(pk)
+        if pk < 1e-5 or (x * w ** 3) > 5495:
+            fht1 = -117.
+            if x > 1:
+                fht1 = 17.372 * _log(x) + fht1
+        else:
+            fht1 = 2.5e-5 * x ** 2 / pk - 8.686 * w - 15
+    else:
+        fht1 = 0.05751 * x - 4.343 * _log(x)
+        if x < 2000:
+            w = 0.0134 * x * math.exp(-0.005 * x)
+            fht1 = (1 - w) * fht1 + w * (17.372 * _log(x) - 117)
+    return fht1
+
+
+@_jit
+def _h0f(r, et):
+    a = (25., 80., 177., 395., 705.)
+    b = (24., 45., 68., 80., 105.)
+    it = math.floor(et)
+    if it <= 0:
+        it = 1
+        q = 0.
+    elif it >= 5:
+        it = 5
+        q = 0.
+    else:
+        q = et - it
+    x = (1 / r) ** 2
+    h0f1 = 4.343 * _log((a[it - 1] * x + b[it - 1]) * x + 1)
+    if q != 0:
+        h0f1 = (1 - q) * h0f1 + q * 4.343 * _log((a[it] * x + b[it]) * x + 1)
+    return h0f1
+
+
+@_jit
+def _ahd(td):
+    if td <= 10e3:
+        return 133.4 + 0.332e-3 * td - 4.343 * _log(td)
+    if td <= 70e3:
+        return 104.6 + 0.212e-3 * td - 1.086 * _log(td)
+    return 71.8 + 0.157e-3 * td + 2.171 * _log(td)
+
+
+@_jit
+def _alos(d, dh, he0, he1, wn, zgnd, emd, aed, wis):
+    q = (1 - 0.8 * math.exp(-d / 50e3)) * dh
+    s = 0.78 * q * math.exp(-(q / 16) ** 0.25)
+    q = he0 + he1
+    sps = q / math.sqrt(d ** 2 + q ** 2)
+    r = (sps - zgnd) / (sps + zgnd) * math.exp(-min(10, wn * s * sps))
+    q = abs(r) ** 2
+    if q < 0.25 or q < sps:
+        r = r * math.sqrt(sps / q)
+    alos1 = emd * d + aed
+    q = wn * he0 * he1 * 2 / d
+    if q > 1.57:
+        q = 3.14 - 2.4649 / q
+    return (-4.343 * _log(abs(complex(math.cos(q), -math.sin(q)) + r) ** 2) - alos1) * wis + alos1
+
+
+@_jit
+def _adiff(d, tha, gme, dla, dl0, dl1, wn, qk, xht, aht, wd1, xd1, dh, afo):
+    third = 1 / 3
+    th = tha + d * gme
+    ds = d - dla
+    q = 0.0795775 * wn * ds * th ** 2
+    adiff1 = _aknfe(q * dl0 / (ds + dl0)) + _aknfe(q * dl1 / (ds + dl1))
+    a = ds / th
+    wa = (a * wn) ** third
+    pk = qk / wa
+    q = (1.607 - pk) * 151.0 * wa * th + xht
+    ar = 0.05751 * q - 4.343 * _log(q) - aht
+    q = (wd1 + xd1 / d) * min(((1 - 0.8 * math.exp(-d / 50e3)) * dh * wn), 6283.2)
+    wd = 25.1 / (25.1 + math.sqrt(q))
+    return ar * wd + (1 - wd) * adiff1 + afo
+
+
+@_jit
+def _ascat(d, h0s, ascat1, the0, the1, he0, he1, tha, ad, rr, etq, wn, gme, ens):
+    """ascat, returns the updated (ascat1, h0s)."""
+    if h0s > 15:
+        h0 = h0s
+    else:
+        th = the0 + the1 + d * gme
+        r2 = 2 * wn * th
+        r1 = r2 * he0
+        r2 = r2 * he1
+        if r1 < 0.2 and r2 < 0.2:
+            ascat1 = 1001.
+        ss = (d - ad) / (d + ad)
+        q = rr / ss
+        ss = max(0.1, ss)
+        q = min(max(0.1, q), 10)
+        z0 = (d - ad) * (d + ad) * th * 0.25 / d
+        et = (etq * math.exp(-min(1.7, z0 / 8.0e3) ** 6) + 1) * z0 / 1.7556e3
+        ett = max(et, 1)
+        h0 = (_h0f(r1, ett) + _h0f(r2, ett)) * 0.5
+        h0 = h0 + min(h0, (1.38 - _log(ett)) * _log(ss) * _log(q) * 0.49)
+        h0 = max(h0, 0)
+        if et < 1:
+            h0 = (et * h0 + (1 - et) * 4.343 *
+                  _log(((1 + 1.4142 / r1) * (1 + 1.4142 / r2)) ** 2 * (r1 + r2) / (r1 + r2 + 2.8284)))
+        if h0 > 15 and h0s >= 0:
+            h0 = h0s
+        if ascat1 != 1001:
+            h0s = h0
+
+    th = tha + d * gme
+    ascat1 = _ahd(th * d) + 4.343 * _log(47.7 * wn * th ** 4) - 0.1 * (ens - 301) * math.exp(-th * d / 40e3) + h0
+    return ascat1, h0s
+
+
+@_jit
+def _lrprop(dist, the0, the1, dl0, dl1, dh, he0, he1, hg0, hg1, wn, gme, ens, zgnd):
+    """lrprop in point-to-point mode (mdp = -1), returns aref."""
+    third = 1 / 3
+    dls0 = math.sqrt(2 * he0 / gme)
+    dls1 = math.sqrt(2 * he1 / gme)
+    dlsa = dls0 + dls1
+    dla = dl0 + dl1
+    tha = max(the0 + the1, -dla * gme)
+
+    # adiff(0, prop)
+    q = hg0 * hg1
+    qk = he0 * he1 - q
+    q = q + 10
+    wd1 = math.sqrt(1 + qk / q)
+    xd1 = dla + tha / gme
+    q = (1 - 0.8 * math.exp(-dlsa / 50e3)) * dh
+    q = 0.78 * q * math.exp(-(q / 16) ** 0.25)
+    afo = min(15, 2.171 * _log(1 + 4.77e-4 * hg0 * hg1 * wn * q))
+    qk = 1 / abs(zgnd)
+    aht = 20.
+    xht = 0.
+    for j in range(2):
+        dl = dl0 if j == 0 else dl1
+        he = he0 if j == 0 else he1
+        a = 0.5 * dl ** 2 / he
+        wa = (a * wn) ** third
+        pk = qk / wa
+        q = (1.607 - pk) * 151.0 * wa * dl / a
+        xht = xht + q
+        aht = aht + _fht(q, pk)
+
+    xae = (wn * gme ** 2) ** (-third)
+    d3 = max(dlsa, 1.3787 * xae + dla)
+    d4 = d3 + 2.7574 * xae
+    a3 = _adiff(d3, tha, gme, dla, dl0, dl1, wn, qk, xht, aht, wd1, xd1, dh, afo)
+    a4 = _adiff(d4, tha, gme, dla, dl0, dl1, wn, qk, xht, aht, wd1, xd1, dh, afo)
+    emd = (a4 - a3) / (d4 - d3)
+    aed = a3 - emd * d3
+    wis = 0.021 / (0.021 + wn * dh / max(10e3, dlsa))
+
+    aref = 0.
+    if dist < dlsa:
+        d2 = dlsa
+        a2 = aed + d2 * emd
+        d0 = 1.908 * wn * he0 * he1
+        if aed >= 0:
+            d0 = min(d0, 0.5 * dla)
+            d1 = d0 + 0.25 * (dla - d0)
+        else:
+            d1 = max(-aed / emd, 0.25 * dla)
+        a1 = _alos(d1, dh, he0, he1, wn, zgnd, emd, aed, wis)
+
+        if d0 < d1:
+            # lrprop's wq is a (truthy) tuple, so the two point fit is always used here
+            a0 = _alos(d0, dh, he0, he1, wn, zgnd, emd, aed, wis)
+            q = _log(d2 / d0)
+            ak2 = max(0, ((d2 - d0) * (a1 - a0) - (d1 - d0) * (a2 - a0)) /
+                      ((d2 - d0) * _log(d1 / d0) - (d1 - d0) * q))
+            ak1 = (a2 - a0 - ak2 * q) / (d2 - d0)
+            if ak1 < 0:
+                ak1 = 0.
+                ak2 = max(a2 - a0, 0) / q
+                if ak2 == 0:
+                    ak1 = emd
+        else:
+            ak1 = max(a2 - a1, 0) / (d2 - d1)
+            ak2 = 0.
+            if ak1 == 0:
+                ak1 = emd
+
+        ael = a2 - ak1 * d2 - ak2 * _log(d2)
+        if dist > 0:
+            aref = ael + ak1 * dist + ak2 * _log(dist)
+
+    if dist <= 0 or dist >= dlsa:
+        ad = dl0 - dl1
+        rr = he1 / he0
+        if ad < 0:
+            ad = -ad
+            rr = 1 / rr
+        etq = (5.67e-6 * ens - 2.32e-3) * ens + 0.031
+        d5 = dla + 200e3
+        d6 = d5 + 200e3
+        a6, h0s = _ascat(d6, -15., 0., the0, the1, he0, he1, tha, ad, rr, etq, wn, gme, ens)
+        a5, h0s = _ascat(d5, h0s, a6, the0, the1, he0, he1, tha, ad, rr, etq, wn, gme, ens)
+
+        if a5 < 1000:
+            ems = (a6 - a5) / 200e3
+            dx = max(max(dlsa, dla + 0.3 * xae * _log(47.7 * wn)), (a5 - aed - ems * d5) / (emd - ems))
+            aes = (emd - ems) * dx + aed
+        else:
+            ems = emd
+            aes = aed
+            dx = 10e6
+
+        if dist > dx:
+            aref = aes + ems * dist
+        else:
+            aref = aed + emd * dist
+
+    return max(aref, 0)
+
+
+@_jit
+def _itm_p2p(profile, distance_km, freq_MHz, transmitter_height, receiver_height, ipol, eps, sgm):
+    n = len(profile)
+    pfl = np.empty(n + 2)
+    pfl[0] = n - 1
+    pfl[1] = distance_km * 1000 / (n - 1)
+    pfl[2:] = profile
+
+    wn = freq_MHz / 47.7
+    ens = 314.
+    gme = 157E-9 * (1 - 0.04665 * math.exp(ens / 179.3))
+    zq = complex(eps, 376.62 * sgm / wn)
+    zgnd = cmath.sqrt(zq - 1)
+    if ipol != 0:
+        zgnd = zgnd / zq
+
+    dist, the0, the1, dl0, dl1, dh, he0, he1 = _profile_geometry(pfl, transmitter_height, receiver_height, gme)
+    aref = _lrprop(dist, the0, the1, dl0, dl1, dh, he0, he1, transmitter_height, receiver_height, wn, gme, ens, zgnd)
+    return 8.685890 * _log(2 * wn * dist) + aref
+
+
+@_jit
+def _itm_batch(profiles, lengths, distances_km, freq_MHz, transmitter_height, receiver_height, ipol, eps, sgm):
+    output = np.empty(len(lengths))
+    for i in range(len(lengths)):
+        output[i] = _itm_p2p(profiles[i, :lengths[i]], distances_km[i], freq_MHz, transmitter_height,
+                             receiver_height, ipol, eps, sgm)
+    return output
+
+
+def itm_p2p(measured_terrain_profile, distance_km: float, freq_MHz: float,
+            transmitter_height: float, receiver_height: float,
+            vertical_polarization: bool = False,
+            terrain_relative_permittivity: float = 15,
+            terrain_conductivity: float = 0.005) -> float:
+    """
+        Compiled version of pathloss.itm.itm_p2p (see there for the parameters).
+
+        Returns
+        -------
+        output : float
+            Pathloss in dB
+        """
+    return float(_itm_p2p(np.asarray(measured_terrain_profile, dtype=np.float64), float(distance_km),
+                          float(freq_MHz), float(transmitter_height), float(receiver_height),
+                          int(vertical_polarization), float(terrain_relative_permittivity),
+                          float(terrain_conductivity)))
+
+
+def itm_batch(profiles: np.ndarray, lengths: np.ndarray, distances_km: np.ndarray, freq_MHz: float,
+              transmitter_height: float, receiver_height: float,
+              vertical_polarization: bool = False,
+              terrain_relative_permittivity: float = 15,
+              terrain_conductivity: float = 0.005) -> np.ndarray:
+    """
+        Compiled version of pathloss.itm_batch.itm_batch, for scalar (shared by all paths) parameters.
+
+        Returns
+        -------
+        output : np.ndarray
+            Pathloss in dB of each path
+        """
+    return _itm_batch(np.asarray(profiles, dtype=np.float64), np.asarray(lengths, dtype=np.int64),
+                      np.asarray(distances_km, dtype=np.float64), float(freq_MHz),
+                      float(transmitter_height), float(receiver_height), int(vertical_polarization),
+                      float(terrain_relative_permittivity), float(terrain_conductivity))
+
+
+# Parity test against the reference (pure Python itmlogic) implementation
+if __name__ == '__main__':
+    from pathloss.itm import itm_p2p as itm_p2p_reference
+
+    rng = np.random.default_rng(0)
+    worst = 0.
+    for _ in range(500):
+        samples = int(rng.integers(5, 600))
+        x = np.linspace(0, rng.uniform(1, 30), samples)
+        terrain = rng.uniform(0, 400) * np.sin(x) + rng.normal(0, rng.uniform(0, 30), samples) + 100
+        distance = samples * rng.uniform(10, 30) / 1e3
+        arguments = (distance, float(rng.choice([150, 900, 3800])), float(rng.uniform(1, 50)),
+                     float(rng.uniform(1, 50)), bool(rng.integers(2)))
+        reference = itm_p2p_reference(terrain.tolist(), *arguments)
+        compiled = itm_p2p(terrain, *arguments)
+        worst = max(worst, abs(reference - compiled))
+    print("Numba " + ("available" if AVAILABLE else "NOT installed, compared the uncompiled kernels"), flush=True)
+    print("Max difference to the reference over 500 random paths: " + str(worst) + " dB", flush=True)
+    assert worst < 1e-9
@@ -0,0 +1,222 @@
+import bisect
+import math
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+import defintions as defs
+from pathloss.itmlogic.diffraction_attenuation.aknfe import aknfe as aknfe_exact
+from pathloss.itmlogic.diffraction_attenuation.fht import fht as fht_exact
+from pathloss.itmlogic.scatter_attenuation.ahd import ahd as ahd_exact
+from pathloss.itmlogic.scatter_attenuation.h0f import h0f as h0f_exact
+
+"""
+Lookup tables for ITM's attenuation functions aknfe, fht, h0f and ahd: piecewise linear interpolation between nodes
+spaced geometrically (POINTS_PER_DECADE per decade), with the last value of each branch and the first of the next one
+as adjacent nodes, so interpolation never crosses a discontinuity. Outside a table's range the exact routine is used.
+
+- aknfe(v2): v2 in [1e-8, 1e10].
+- fht(x, pk): the x >= 200 branch does not depend on pk and is tabulated for x in [200, 1e9]; the x < 200 branch
+  is cheap algebra and stays exact.
+- h0f(r, et): h0f interpolates linearly in et between the integers 1 to 5, so it is tabulated as five functions of r
+  (r in [1e-4, 1e6]) combined with h0f's own et weights, which keeps it exact in et.
+- ahd(td): td in [1, 1e9].
+
+The tables are built once, from the scalar itmlogic routines, and kept in defs.ITM_TABLES_CACHE_FILE; they are only
+loaded (or built) on first use, see tables.
+The maximum error of each table is measured when it is built (against the exact routine, at the quarter, half and
+three quarter points between all nodes) and kept as its max_error: 1e-4 dB for aknfe and ahd, 2e-4 dB for fht and
+3e-4 dB for h0f (for all et), see python -m pathloss.itm_tables.
+The functions take floats (returning floats) or arrays (returning arrays), like the exact scalar and array versions.
+
+The tables are not faster than the formulas everywhere: NumPy's log and sqrt are vectorized and cost about as much as
+the binary search np.interp does per element, and math.log is cheaper than bisect in Python. On 200k unsorted
+inputs the tables take about 0.6x the time of the array fht, 1.1x of aknfe and 2x of h0f, and a scalar lookup
+about 3x the exact routine, so itm_batch only uses them on request (lookup_tables=True), where the attenuation
+functions are a few percent of a batch's time (path geometry dominates), and the scalar routines only on request
+too (ITMSession(lookup_tables=True), which sets Prop.lookup_tables for adiff and ascat).
+"""
+
+TABLES_VERSION = 1
+
+POINTS_PER_DECADE = 200
+
+
+class Table:
+    """Piecewise linear interpolation of function(x) between nodes, function itself outside [nodes[0], nodes[-1])."""
+
+    def __init__(self, function, nodes: np.ndarray, values: np.ndarray, max_error: float = math.nan):
+        self.function = function
+        self.nodes, self.values = nodes, values
+        self.lo, self.hi = float(nodes[0]), float(nodes[-1])
+        # Python lists for scalar lookups (bisect on a list is much faster than indexing arrays element by element)
+        self.node_list, self.value_list = nodes.tolist(), values.tolist()
+        self.max_error = max_error
+
+    def __call__(self, x):
+        if np.ndim(x) == 0:
+            return self.scalar(float(x))
+        x = np.asarray(x, dtype=np.float64)
+        output = np.interp(x, self.nodes, self.values)
+        outside = (x < self.lo) | (x >= self.hi)
+        if outside.any():
+            output[outside] = [self.function(value) for value in x[outside].tolist()]
+        return output
+
+    def scalar(self, x: float) -> float:
+        if not self.lo <= x < self.hi:
+            return self.function(x)
+        i = bisect.bisect_right(self.node_list, x)
+        x0, x1 = self.node_list[i - 1], self.node_list[i]
+        y0, y1 = self.value_list[i - 1], self.value_list[i]
+        return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+def geometric_nodes(lo: float, hi: float, branch_points=()) -> np.ndarray:
+    """Nodes from lo to hi, POINTS_PER_DECADE per decade, and each branch point (the first value of a branch) with the
+       float just before it (the last value of the previous branch), so interpolation never crosses a branch point."""
+    nodes = np.geomspace(lo, hi, int(round(math.log10(hi / lo) * POINTS_PER_DECADE)) + 1)
+    branch_points = np.array(branch_points, dtype=np.float64)
+    return np.unique(np.concatenate((nodes, branch_points, np.nextafter(branch_points, -np.inf))))
+
+
+def check_points(nodes: np.ndarray) -> np.ndarray:
+    """Quarter points, midpoints and three quarter points between all nodes."""
+    x0, x1 = nodes[:-1], nodes[1:]
+    return np.concatenate([x0 + (x1 - x0) * f for f in (0.25, 0.5, 0.75)])
+
+
+def build_table(function, lo: float, hi: float, branch_points=()) -> Table:
+    nodes = geometric_nodes(lo, hi, branch_points)
+    table = Table(function, nodes, np.array([function(x) for x in nodes.tolist()]))
+    points = check_points(nodes)
+    exact = np.array([function(x) for x in points.tolist()])
+    table.max_error = float(np.abs(table(points) - exact).max())
+    return table
+
+
+def h0f_rows(r: float):
+    """h0f(r, et) at et = 1 to 5 (h0f's nodes in et)."""
+    return [h0f_exact(r, et) for et in (1, 2, 3, 4, 5)]
+
+
+def build() -> Dict[str, Table]:
+    tables = {'aknfe': build_table(aknfe_exact, 1e-8, 1e10, (5.76,)),
+              'fht': build_table(lambda x: fht_exact(x, 1.0), 200, 1e9, (2000,)),
+              'ahd': build_table(ahd_exact, 1, 1e9, np.nextafter([10e3, 70e3], np.inf))}
+
+    nodes = geometric_nodes(1e-4, 1e6)
+    rows = np.array([h0f_rows(r) for r in nodes.tolist()]).T
+    table = Table(h0f_exact, nodes, rows)
+    points = check_points(nodes)
+    errors = [np.abs(h0f(points, et, table) - [h0f_exact(r, et) for r in points.tolist()]).max()
+              for et in np.arange(1, 5.01, 0.25).tolist()]
+    table.max_error = float(max(errors))
+    tables['h0f'] = table
+    return tables
+
+
+def save(tables: Dict[str, Table], file: Path = None):
+    file = Path(file or defs.ITM_TABLES_CACHE_FILE)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {}
+    for name, table in tables.items():
+        arrays[name + '_nodes'] = table.nodes
+        arrays[name + '_values'] = table.values
+        arrays[name + '_max_error'] = table.max_error
+    temporary_file = file.with_suffix(".tmp.npz")
+    np.savez(temporary_file, version=TABLES_VERSION, points_per_decade=POINTS_PER_DECADE, **arrays)
+    temporary_file.replace(file)
+
+
+def load(file: Path = None) -> Dict[str, Table]:
+    """Tables saved by save, built (and saved) if there is no (current) file."""
+    file = Path(file or defs.ITM_TABLES_CACHE_FILE)
+    functions = {'aknfe': aknfe_exact, 'fht': lambda x: fht_exact(x, 1.0), 'ahd': ahd_exact, 'h0f': h0f_exact}
+    if file.is_file():
+        with np.load(file) as saved:
+            if int(saved['version']) == TABLES_VERSION and int(saved['points_per_decade']) == POINTS_PER_DECADE:
+                return {name: Table(function, saved[name + '_nodes'], saved[name + '_values'],
+                                    float(saved[name + '_max_error']))
+                        for name, function in functions.items()}
+    tables = build()
+    save(tables, file)
+    return tables
+
+
+@lru_cache(maxsize=None)
+def tables() -> Dict[str, Table]:
+    """The tables, loaded (or built and saved) on first use."""
+    return load()
+
+
+def aknfe(v2):
+    """aknfe from its table."""
+    return tables()['aknfe'](v2)
+
+
+def fht(x, pk):
+    """fht from the table of its x >= 200 branch, exact below."""
+    table = tables()['fht']
+    if np.ndim(x) == 0 and np.ndim(pk) == 0:
+        return table.scalar(float(x)) if x >= 200 else fht_exact(float(x), float(pk))
+    x, pk = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(pk, dtype=np.float64))
+    output = np.interp(x, table.nodes, table.values)
+    above = x >= table.hi
+    if above.any():
+        output[above] = [table.function(value) for value in x[above].tolist()]
+    low = x < 200
+    if low.any():
+        x, pk = x[low], pk[low]
+        w = -np.log(pk)
+        value = np.where(x > 1, 17.372 * np.log(x) - 117, -117)
+        output[low] = np.where((pk < 1e-5) | ((x * w ** 3) > 5495), value, 2.5e-5 * x ** 2 / pk - 8.686 * w - 15)
+    return output
+
+
+def h0f(r, et, table: Table = None):
+    """h0f from the tables of h0f(r, 1) to h0f(r, 5), weighted in et like h0f."""
+    table = table or tables()['h0f']
+    if np.ndim(r) == 0 and np.ndim(et) == 0:
+        r, et = float(r), float(et)
+        if not table.lo <= r < table.hi:
+            return h0f_exact(r, et)
+        it = math.floor(et)
+        q = 0 if it <= 0 or it >= 5 else et - it
+        it = min(max(it, 1), 5)
+        i = bisect.bisect_right(table.node_list, r)
+        w = (r - table.node_list[i - 1]) / (table.node_list[i] - table.node_list[i - 1])
+        row = table.value_list[it - 1]
+        h0f1 = row[i - 1] + (row[i] - row[i - 1]) * w
+        if q != 0:
+            row = table.value_list[it]
+            h0f1 = (1 - q) * h0f1 + q * (row[i - 1] + (row[i] - row[i - 1]) * w)
+        return h0f1
+
+    r, et = np.broadcast_arrays(np.asarray(r, dtype=np.float64), np.asarray(et, dtype=np.float64))
+    it = np.floor(et)
+    q = np.where((it <= 0) | (it >= 5), 0, et - it)
+    it = np.clip(it, 1, 5).astype(np.int64)
+    nodes, values = table.nodes, table.values
+    i = np.clip(np.searchsorted(nodes, r, side='right'), 1, len(nodes) - 1)
+    w = (r - nodes[i - 1]) / (nodes[i] - nodes[i - 1])
+    h0f1 = values[it - 1, i - 1] + (values[it - 1, i] - values[it - 1, i - 1]) * w
+    upper = np.minimum(it, 4)  # Only used where q != 0, i.e. it < 5
+    h0f1 = np.where(q != 0, (1 - q) * h0f1 + q * (values[upper, i - 1] + (values[upper, i] - values[upper, i - 1]) * w),
+                    h0f1)
+    outside = ~((r >= table.lo) & (r < table.hi))
+    if outside.any():
+        h0f1[outside] = [h0f_exact(*values) for values in zip(r[outside].tolist(), et[outside].tolist())]
+    return h0f1
+
+
+def ahd(td):
+    """ahd from its table."""
+    return tables()['ahd'](td)
+
+
+if __name__ == '__main__':
+    for name, table in tables().items():
+        print(name + ': ' + str(len(table.nodes)) + ' nodes, max error ' + str(table.max_error) + ' dB')
@@ -1,9 +1,9 @@
 import math
 
-import numpy as np
-
+from pathloss import itm_tables
 from pathloss.itmlogic.diffraction_attenuation.aknfe import aknfe
 from pathloss.itmlogic.diffraction_attenuation.fht import fht
+from pathloss.itmlogic.misc.log import log
 
 
 def adiff(d, prop):
@@ -22,83 +22,85 @@ def adiff(d, prop):
     ----------
     d : float
         Distance in meters.
-    prop : dict
-        Contains all input propagation parameters
+    prop : Prop
+        Contains all input propagation parameters (with lookup_tables, aknfe and fht are read from
+        the tables of pathloss.itm_tables)
 
     Returns
     -------
     adiff1 : float
         Returns the estimated diffraction attenuation.
-    prop : dict
+    prop : Prop
         Contains all input and output propagation parameters.
 
     """
     third = 1 / 3
+    aknfe_, fht_ = (itm_tables.aknfe, itm_tables.fht) if prop.lookup_tables else (aknfe, fht)
 
     if d == 0:
-        q = prop['hg'][0] * prop['hg'][1]
+        q = prop.hg[0] * prop.hg[1]
 
-        prop['qk'] = prop['he'][0] * prop['he'][1] - q
+        prop.qk = prop.he[0] * prop.he[1] - q
 
-        if prop['mdp'] < 0:
+        if prop.mdp < 0:
             q = q + 10
 
-        prop['wd1'] = math.sqrt(1 + prop['qk'] / q)
-        prop['xd1'] = prop['dla'] + prop['tha'] / prop['gme']
+        prop.wd1 = math.sqrt(1 + prop.qk / q)
+        prop.xd1 = prop.dla + prop.tha / prop.gme
 
-        q = (1 - 0.8 * math.exp(-prop['dlsa'] / 50e3)) * prop['dh']
+        q = (1 - 0.8 * math.exp(-prop.dlsa / 50e3)) * prop.dh
         q = 0.78 * q * math.exp(-(q / 16) ** 0.25)
 
-        prop['afo'] = (
-            min(15, 2.171 * np.log(1 + 4.77e-4 * prop['hg'][0]
-                                   * prop['hg'][1] * prop['wn'] * q))
+        prop.afo = (
+            min(15, 2.171 * log(1 + 4.77e-4 * prop.hg[0]
+                                * prop.hg[1] * prop.wn * q))
         )
 
-        prop['qk'] = 1 / abs(prop['zgnd'])
-        prop['aht'] = 20
-        prop['xht'] = 0
+        prop.qk = 1 / abs(prop.zgnd)
+        prop.aht = 20
+        prop.xht = 0
 
         for j in range(0, 2):
-            a = 0.5 * prop['dl'][j] ** 2 / prop['he'][j]
-            wa = (a * prop['wn']) ** third
-            pk = prop['qk'] / wa
+            a = 0.5 * prop.dl[j] ** 2 / prop.he[j]
+            wa = (a * prop.wn) ** third
+            pk = prop.qk / wa
 
-            q = (1.607 - pk) * 151.0 * wa * prop['dl'][j] / a
+            q = (1.607 - pk) * 151.0 * wa * prop.dl[j] / a
 
-            prop['xht'] = prop['xht'] + q
-            prop['aht'] = prop['aht'] + fht(q, pk)
+            prop.xht = prop.xht + q
+            prop.aht = prop.aht + fht_(q, pk)
 
         adiff1 = 0
 
     else:
 
-        th = prop['tha'] + d * prop['gme']
+        th = prop.tha + d * prop.gme
 
-        ds = d - prop['dla']
+        ds = d - prop.dla
 
-        q = 0.0795775 * prop['wn'] * ds * th ** 2
+        q = 0.0795775 * prop.wn * ds * th ** 2
 
-        adiff1 = aknfe(q * prop['dl'][0] /
-                       (ds + prop['dl'][0])) + aknfe(q * prop['dl'][1] /
-                                                     (ds + prop['dl'][1]))
+        adiff1 = aknfe_(q * prop.dl[0] /
+                        (ds + prop.dl[0])) + aknfe_(q * prop.dl[1] /
+                                                    (ds + prop.dl[1]))
 
         a = ds / th
-        wa = (a * prop['wn']) ** third
+        wa = (a * prop.wn) ** third
 
-        pk = prop['qk'] / wa
+        pk = prop.qk / wa
 
-        q = (1.607 - pk) * 151.0 * wa * th + prop['xht']
+        q = (1.607 - pk) * 151.0 * wa * th + prop.xht
 
-        ar = 0.05751 * q - 4.343 * np.log(q) - prop['aht']
+        ar = 0.05751 * q - 4.343 * log(q) - prop.aht
 
         q = (
-                (prop['wd1'] + prop['xd1'] / d) *
+                (prop.wd1 + prop.xd1 / d) *
                 min(((1 - 0.8 * math.exp(-d / 50e3)) *
-                     prop['dh'] * prop['wn']), 6283.2)
+                     prop.dh * prop.wn), 6283.2)
         )
 
         wd = 25.1 / (25.1 + math.sqrt(q))
 
-        adiff1 = ar * wd + (1 - wd) * adiff1 + prop['afo']
+        adiff1 = ar * wd + (1 - wd) * adiff1 + prop.afo
 
     return adiff1, prop
@@ -1,6 +1,6 @@
 import math
 
-import numpy as np
+from pathloss.itmlogic.misc.log import log
 
 
 def aknfe(v2):
@@ -27,6 +27,6 @@ def aknfe(v2):
 
     else:
 
-        aknfe1 = 12.953 + 4.343 * np.log(v2)
+        aknfe1 = 12.953 + 4.343 * log(v2)
 
     return aknfe1
@@ -0,0 +1,25 @@
+import math
+
+
+def log(x):
+    """
+    Natural logarithm of a Python float with np.log's results outside its domain (-inf for 0, nan for negative
+    numbers and nan) instead of math.log's ValueError, so the scalar routines keep their numpy behaviour
+    at math's speed.
+
+    Parameters
+    ----------
+    x : float
+        Input value.
+
+    Returns
+    -------
+    log1 : float
+        Natural logarithm of x.
+
+    """
+    if x > 0:
+        return math.log(x)
+    if x == 0:
+        return -math.inf
+    return math.nan
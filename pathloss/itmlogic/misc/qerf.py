@@ -1,4 +1,4 @@
-import math
+import numpy as np
 
 
 def qerf(z):
@@ -8,13 +8,13 @@ def qerf(z):
 
     Parameters
     ----------
-    z : float
+    z : float or np.ndarray
         Defined value to assess the probability of exceedance of a standardized normal random
-        variable.
+        variable (elementwise for arrays).
 
     Returns
     -------
-    qerf1 : float
+    qerf1 : float or np.ndarray
         The standard normal complementary probability
 
     """
@@ -24,26 +24,19 @@ def qerf(z):
     b4 = -1.821255987
     b5 = 1.330274429
     rp = 4.317008
-
     rrt2pi = 0.398942280
 
-    x = z
-    t = abs(x)
-
-    if t >= 10:
-
-        qerf1 = 0
-
-    else:
-
-        t = rp / (t + rp)
+    x = np.asarray(z, dtype=np.float64)
+    t = np.abs(x)
+    far = t >= 10
 
-        qerf1 = (
-                math.exp(-0.5 * x ** 2) * rrt2pi *
-                ((((b5 * t + b4) * t + b3) * t + b2) * t + b1) * t
-        )
+    t = rp / (t + rp)
+    qerf1 = np.where(
+        far, 0,
+        np.exp(-0.5 * x ** 2) * rrt2pi *
+        ((((b5 * t + b4) * t + b3) * t + b2) * t + b1) * t
+    )
 
-    if x < 0:
-        qerf1 = 1 - qerf1
+    qerf1 = np.where(x < 0, 1 - qerf1, qerf1)
 
-    return qerf1
+    return qerf1 if qerf1.ndim else float(qerf1)
@@ -1,5 +1,3 @@
-import math
-
 import numpy as np
 
 
@@ -10,13 +8,13 @@ def qerfi(q):
 
     Parameters
     ----------
-    q : list of float
+    q : list of float or np.ndarray
         Confidence levels for predictions (e.g. [0.01, 0.1, 0.5, 0.9, 0.99])
 
     Returns
     -------
-    qerfi1 : list of float
-        Inverse of the standard normal complementary probability
+    qerfi1 : np.ndarray
+        Inverse of the standard normal complementary probability, elementwise
 
     """
     c0 = 2.515516698
@@ -26,31 +24,17 @@ def qerfi(q):
     d2 = 0.189269
     d3 = 0.001308
 
-    x = [0.5 - x for x in q]
-
-    t = []
-
-    for i in range(len(x)):
-        t.append(max(0.5 - abs(x[i]), 0.000001))
-
-    output = []
-
-    index = 0
-    for entry in t:
-        interim_result = math.sqrt(-2 * np.log(entry))
-
-        qerfi1 = (interim_result - (
-                (c2 * interim_result + c1) *
-                interim_result + c0) /
-                  (((d3 * interim_result + d2) *
-                    interim_result + d1) *
-                   interim_result + 1))
-
-        if x[index] < 0:
-            qerfi1 = -qerfi1
+    x = 0.5 - np.asarray(q, dtype=np.float64)
+    t = np.maximum(0.5 - np.abs(x), 0.000001)
 
-        output.append(round(qerfi1, 4))
+    interim_result = np.sqrt(-2 * np.log(t))
+    qerfi1 = (interim_result - (
+            (c2 * interim_result + c1) *
+            interim_result + c0) /
+              (((d3 * interim_result + d2) *
+                interim_result + d1) *
+               interim_result + 1))
 
-        index += 1
+    qerfi1 = np.where(x < 0, -qerfi1, qerfi1)
 
-    return output
+    return np.round(qerfi1, 4)
@@ -0,0 +1,128 @@
+import operator
+from dataclasses import dataclass, field, fields
+from typing import List
+
+
+@dataclass(slots=True)
+class Prop:
+    """
+    Propagation state shared by the itmlogic routines (the prop structure of the original Fortran/the prop dict
+    of itmlogic), as a fixed-layout object: attribute access on slots is much cheaper than string keys on a dict.
+
+    Two-element lists hold the transmitter [0] and receiver [1] values.
+    """
+
+    # Inputs
+    fmhz: float = 0.
+    hg: List[float] = field(default_factory=lambda: [0., 0.])
+    eps: float = 0.
+    sgm: float = 0.
+    klim: int = 0
+    ipol: int = 0
+    ens0: float = 0.
+    d: float = 0.
+    pfl: List[float] = field(default_factory=list)
+
+    # Control
+    lvar: int = 0
+    kwx: int = 0
+    mdp: int = 0
+    klimx: int = 0
+    mdvar: int = 0
+    mdvarx: int = 0
+    lookup_tables: bool = False  # adiff and ascat use the tables of pathloss.itm_tables
+
+    # General preparation (qlrps)
+    gma: float = 0.
+    wn: float = 0.
+    ens: float = 0.
+    gme: float = 0.
+    zgnd: complex = 0j
+
+    # Path geometry (qlrpfl/qlra)
+    dist: float = 0.
+    dh: float = 0.
+    he: List[float] = field(default_factory=lambda: [0., 0.])
+    dl: List[float] = field(default_factory=lambda: [0., 0.])
+    the: List[float] = field(default_factory=lambda: [0., 0.])
+
+    # Reference attenuation (lrprop)
+    dls: List[float] = field(default_factory=lambda: [0., 0.])
+    dlsa: float = 0.
+    dla: float = 0.
+    tha: float = 0.
+    wlos: int = 0
+    wscat: int = 0
+    dmin: float = 0.
+    xae: float = 0.
+    emd: float = 0.
+    aed: float = 0.
+    wis: float = 0.
+    ak1: float = 0.
+    ak2: float = 0.
+    ael: float = 0.
+    aref: float = 0.
+    ems: float = 0.
+    aes: float = 0.
+    dx: float = 0.
+
+    # Diffraction (adiff)
+    qk: float = 0.
+    wd1: float = 0.
+    xd1: float = 0.
+    afo: float = 0.
+    aht: float = 0.
+    xht: float = 0.
+
+    # Scatter (ascat)
+    ad: float = 0.
+    rr: float = 0.
+    etq: float = 0.
+    h0s: float = 0.
+    ascat1: float = 0.
+
+    # Variability (avar)
+    cv1: float = 0.
+    cv2: float = 0.
+    yv1: float = 0.
+    yv2: float = 0.
+    yv3: float = 0.
+    csm1: float = 0.
+    csm2: float = 0.
+    ysm1: float = 0.
+    ysm2: float = 0.
+    ysm3: float = 0.
+    csp1: float = 0.
+    csp2: float = 0.
+    ysp1: float = 0.
+    ysp2: float = 0.
+    ysp3: float = 0.
+    csd1: float = 0.
+    zd: float = 0.
+    cfm1: float = 0.
+    cfm2: float = 0.
+    cfm3: float = 0.
+    cfp1: float = 0.
+    cfp2: float = 0.
+    cfp3: float = 0.
+    kdv: int = 0
+    ws: bool = False
+    wl: bool = False
+    gm: float = 0.
+    gp: float = 0.
+    dexa: float = 0.
+    vmd: float = 0.
+    sgtm: float = 0.
+    sgtp: float = 0.
+    sgtd: float = 0.
+    tgtd: float = 0.
+    sgl: float = 0.
+    vs0: float = 0.
+
+    def __copy__(self) -> 'Prop':
+        # Shallow copy through __init__: copy.copy's generic path (__reduce_ex__) is several times slower on slots,
+        # and ITMSession copies its template for every path
+        return Prop(*_field_values(self))
+
+
+_field_values = operator.attrgetter(*(prop_field.name for prop_field in fields(Prop)))
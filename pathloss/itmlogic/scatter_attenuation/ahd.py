@@ -1,4 +1,4 @@
-import numpy as np
+from pathloss.itmlogic.misc.log import log
 
 
 def ahd(td):
@@ -32,6 +32,6 @@ def ahd(td):
     else:
         i = 2
 
-    ahd1 = a[i] + b[i] * td + c[i] * np.log(td)
+    ahd1 = a[i] + b[i] * td + c[i] * log(td)
 
     return ahd1
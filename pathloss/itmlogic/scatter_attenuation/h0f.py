@@ -1,4 +1,6 @@
-import numpy as np
+import math
+
+from pathloss.itmlogic.misc.log import log
 
 
 def h0f(r, et):
@@ -24,7 +26,7 @@ def h0f(r, et):
     a = [25, 80, 177, 395, 705]
     b = [24, 45, 68, 80, 105]
 
-    it = int(np.floor(et))
+    it = math.floor(et)
 
     if it <= 0:
         it = 1
@@ -38,12 +40,12 @@ def h0f(r, et):
         q = et - it
 
     x = (1 / r) ** 2
-    h0f1 = 4.343 * np.log((a[it - 1] * x + b[it - 1]) * x + 1)
+    h0f1 = 4.343 * log((a[it - 1] * x + b[it - 1]) * x + 1)
 
     if q != 0:
         h0f1 = (
                 (1 - q) * h0f1 + q * 4.343 *
-                np.log((a[it] * x + b[it]) * x + 1)
+                log((a[it] * x + b[it]) * x + 1)
         )
 
     return h0f1
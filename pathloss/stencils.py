@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+import defintions as defs
+
+"""
+Cache of ray stencils: the (y, x) offsets from the receiver's square of the squares terrain_p2p_yx samples.
+They only depend on the (y, x) difference between transmitter and receiver and on the number of samples,
+so any transmitter (in any run) reads a profile with one fancy index: elevation[receiver_y + oy, receiver_x + ox].
+
+terrain_p2p_yx truncates receiver + (diff / num_samples) * n in floating point, stencils use the exact
+floor(diff * n / num_samples). They differ only where the floating point value lands on the wrong side of an integer,
+about 0.02% of samples, each moved by one square.
+
+Stencils are keyed by the exact (diff_y, diff_x, num_samples): floor(diff * n / num_samples) of one number of samples
+is no prefix of another's. The cache is bounded: it keeps the most recently used stencils up to max_bytes (in memory
+and in the file), evicting the least recently used ones, so it does not grow with every new transmitter geometry.
+Missing stencils of a batch of receivers are built together, with array arithmetic.
+"""
+
+STENCIL_VERSION = 1
+DEFAULT_MAX_BYTES = 64 * 1024 ** 2
+
+Key = Tuple[int, int, int]
+
+
+def build(diff_y: np.ndarray, diff_x: np.ndarray, num_samples: np.ndarray) -> np.ndarray:
+    """(2, receivers, max samples) int32 stencils of many receivers at once, padding offsets are 0."""
+    num_samples = np.asarray(num_samples, dtype=np.float64)[:, np.newaxis]
+    n = np.arange(int(num_samples.max(initial=0)), dtype=np.float64)
+    n = np.where(n < num_samples, n, 0)
+    stencils = np.empty((2,) + n.shape, dtype=np.int32)
+    for stencil, diff in zip(stencils, (diff_y, diff_x)):
+        # floor(diff * n / num_samples) exactly, the same squares whatever the receiver's position: diff * n is an
+        # exact integer in float64, and a quotient that is no integer is at least 1 / num_samples away from one,
+        # much more than the division's rounding error (much faster than integer floor division)
+        quotient = np.multiply(np.asarray(diff, dtype=np.float64)[:, np.newaxis], n)
+        quotient /= num_samples
+        stencil[...] = np.floor(quotient, out=quotient)
+    return stencils
+
+
+class StencilCache:
+    """Stencils by (diff_y, diff_x, num_samples), built on first use, at most max_bytes of them (least recently used
+       evicted first), optionally persisted to an .npz file."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        # In least to most recently used order
+        self.stencils: Dict[Key, np.ndarray] = OrderedDict()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.modified = False
+
+    def __len__(self) -> int:
+        return len(self.stencils)
+
+    def add(self, key: Key, stencil: np.ndarray):
+        self.stencils[key] = stencil
+        self.bytes += stencil.nbytes
+        self.modified = True
+
+    def evict(self):
+        """Drop least recently used stencils until the cache fits in max_bytes."""
+        while self.bytes > self.max_bytes and self.stencils:
+            self.bytes -= self.stencils.popitem(last=False)[1].nbytes
+
+    def stencil(self, diff_y: int, diff_x: int, num_samples: int) -> np.ndarray:
+        """(2, num_samples) int32 array of (y, x) offsets from the receiver."""
+        offsets_y, offsets_x = self.offsets(np.array([diff_y]), np.array([diff_x]), np.array([num_samples]))
+        return np.stack((offsets_y[0], offsets_x[0]))
+
+    def offsets(self, diff_y: np.ndarray, diff_x: np.ndarray, num_samples: np.ndarray) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """Padded (receivers, max samples) y and x offsets, padding offsets are 0 (the receiver's square)."""
+        offsets = np.zeros((2, len(num_samples), int(num_samples.max(initial=0))), dtype=np.int32)
+        missing = []
+        for i, key in enumerate(zip(diff_y.tolist(), diff_x.tolist(), num_samples.tolist())):
+            stencil = self.stencils.get(key)
+            if stencil is None:
+                missing.append(i)
+            else:
+                self.stencils.move_to_end(key)
+                offsets[:, i, :key[2]] = stencil
+        if missing:
+            missing = np.array(missing)
+            built = build(diff_y[missing], diff_x[missing], num_samples[missing])
+            offsets[:, missing, :built.shape[2]] = built
+            for j, key in enumerate(zip(diff_y[missing].tolist(), diff_x[missing].tolist(),
+                                        num_samples[missing].tolist())):
+                if key not in self.stencils:
+                    self.add(key, built[:, j, :key[2]].copy())
+            self.evict()
+        return offsets[0], offsets[1]
+
+    def save(self, file: Path = None):
+        """Write all stencils to one .npz file (keys, lengths and concatenated offsets, least recently used first)."""
+        file = Path(file or defs.STENCIL_CACHE_FILE)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        keys = np.array(list(self.stencils.keys()), dtype=np.int32).reshape(-1, 3)
+        offsets = np.concatenate(list(self.stencils.values()), axis=1) \
+            if len(keys) else np.zeros((2, 0), dtype=np.int32)
+        temporary_file = file.with_suffix(".tmp.npz")
+        np.savez(temporary_file, version=STENCIL_VERSION, keys=keys, offsets=offsets)
+        temporary_file.replace(file)
+        self.modified = False
+
+
+def load(file: Path = None, max_bytes: int = DEFAULT_MAX_BYTES) -> StencilCache:
+    """Stencils saved by StencilCache.save (the most recently used ones up to max_bytes),
+       an empty cache if there is no (current) file."""
+    file = Path(file or defs.STENCIL_CACHE_FILE)
+    cache = StencilCache(max_bytes)
+    if not file.is_file():
+        return cache
+    with np.load(file) as saved:
+        if int(saved['version']) != STENCIL_VERSION:
+            return cache
+        keys = saved['keys']
+        offsets = saved['offsets']
+    # Only the most recently used stencils (at the end) that fit in max_bytes
+    fits = np.cumsum(keys[::-1, 2].astype(np.int64) * 2 * offsets.itemsize)[::-1] <= max_bytes
+    first = int(np.argmax(fits)) if fits.any() else len(keys)
+    ends = np.cumsum(keys[:, 2])
+    if first > 0:
+        keys, offsets, ends = keys[first:], offsets[:, ends[first - 1]:].copy(), ends[first:] - ends[first - 1]
+    for key, end in zip(keys.tolist(), ends.tolist()):
+        cache.stencils[tuple(key)] = offsets[:, end - key[2]:end]
+    cache.bytes = offsets.nbytes
+    return cache
@@ -1,8 +1,12 @@
 import math
 from typing import Tuple, List
 
+import numpy as np
+
 import terrain_map
-from terrain_map import TerrainMap
+from pathloss.stencils import StencilCache
+from terrain_map import GeoreferencedMap
+from terrain_map.pyramid import ElevationPyramid
 
 
 def determine_num_samples(distance_m: float, max_samples: int = 600) -> int:
@@ -31,9 +35,10 @@ def determine_num_samples(distance_m: float, max_samples: int = 600) -> int:
 
 
 def terrain_p2p(max_samples: int,
-                tmap: TerrainMap,
+                tmap: GeoreferencedMap,
                 transmitter_coordinates: Tuple[float, float],
-                receiver_coordinates: Tuple[float, float]) \
+                receiver_coordinates: Tuple[float, float],
+                use_pyramid: bool = False) \
         -> Tuple[List[float], float]:
     """
     This module takes a set of point coordinates and returns
@@ -43,12 +48,14 @@ def terrain_p2p(max_samples: int,
     ----------
     max_samples : int
         Less than 2 and above 600 will be ignored
-    tmap : TerrainMap
-        Contains elevation data
+    tmap : GeoreferencedMap
+        Contains elevation data (TerrainMap or TiledTerrainMap)
     transmitter_coordinates : Tuple[float, float]
         Transmitter coordinates
     receiver_coordinates : Tuple[float, float]
         Receiver coordinates
+    use_pyramid : bool
+        Raise samples to the highest square the path crosses around them (see terrain_p2p_yx)
 
     Returns
     -------
@@ -61,21 +68,171 @@ def terrain_p2p(max_samples: int,
 
     # Geographic distance
     distance_m = terrain_map.coordinates_distance(transmitter_coordinates, receiver_coordinates)
+
+    transmitter = tmap.coords_to_map_yx(transmitter_coordinates)
+    receiver = tmap.coords_to_map_yx(receiver_coordinates)
+
+    return terrain_p2p_yx(max_samples, tmap, transmitter, receiver, distance_m,
+                          pyramid=tmap.pyramid() if use_pyramid else None)
+
+
+def terrain_p2p_yx(max_samples: int,
+                   tmap: GeoreferencedMap,
+                   transmitter_yx: Tuple[int, int],
+                   receiver_yx: Tuple[int, int],
+                   distance_m: float,
+                   pyramid: ElevationPyramid | None = None) \
+        -> Tuple[List[float], float]:
+    """
+    Same as terrain_p2p, for map positions whose distance is already known
+    (e.g. from GeoreferencedMap.map_yx_to_coords_array and coordinates_distance_array).
+
+    Parameters
+    ----------
+    max_samples : int
+        Less than 2 and above 600 will be ignored
+    tmap : GeoreferencedMap
+        Contains elevation data (TerrainMap or TiledTerrainMap)
+    transmitter_yx : Tuple[int, int]
+        Transmitter map position
+    receiver_yx : Tuple[int, int]
+        Receiver map position
+    distance_m : float
+        Distance in meters between the antenna and receiver.
+    pyramid : ElevationPyramid | None
+        If given, every sample but the two ends is raised to the highest of the squares the path crosses between the
+        midpoints to its neighbouring samples (see ElevationPyramid.path_max), so sparse samples do not skip over
+        peaks.
+
+    Returns
+    -------
+    surface_profile : List
+        Contains the surface profile measurements in meters.
+    distance_km : float
+        Distance in kilometers between the antenna and receiver.
+
+    """
+
     distance_km = distance_m / 1e3
 
     # Interpolate along line to get sampling points
     num_samples = determine_num_samples(distance_m, max_samples)
 
-    transmitter = tmap.coords_to_map_yx(transmitter_coordinates)
-    receiver = tmap.coords_to_map_yx(receiver_coordinates)
+    diff_y = transmitter_yx[0] - receiver_yx[0]
+    diff_x = transmitter_yx[1] - receiver_yx[1]
 
-    diff_y = transmitter[0] - receiver[0]
-    diff_x = transmitter[1] - receiver[1]
+    n = np.arange(num_samples)
+    y = (receiver_yx[0] + ((diff_y / num_samples) * n)).astype(int)
+    x = (receiver_yx[1] + ((diff_x / num_samples) * n)).astype(int)
 
-    surface_profile: List[float] = []
-    for n in range(0, num_samples):
-        y = int(receiver[0] + ((diff_y / num_samples) * n))
-        x = int(receiver[1] + ((diff_x / num_samples) * n))
-        surface_profile.append(tmap[y][x].elevation)
+    elevations = tmap.elevation_at(y, x)
+    if pyramid is not None:
+        elevations = np.maximum(elevations, pyramid.path_max(np.array([receiver_yx[0]]), np.array([receiver_yx[1]]),
+                                                             np.array([diff_y]), np.array([diff_x]),
+                                                             np.array([num_samples]))[0])
+    surface_profile: List[float] = elevations.tolist()
 
     return surface_profile, distance_km
+
+
+def terrain_profiles_yx(max_samples: int,
+                        tmap: GeoreferencedMap,
+                        transmitter_yx: Tuple[int, int],
+                        receivers_y: np.ndarray,
+                        receivers_x: np.ndarray,
+                        distances_m: np.ndarray,
+                        pyramid: ElevationPyramid | None = None,
+                        bilinear: bool = False,
+                        stencils: StencilCache | None = None) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Surface profiles from one transmitter to many receivers, in one gather over the elevation data.
+    Profile i is profiles[i, :lengths[i]], identical to terrain_p2p_yx for the same receiver
+    (unless bilinear is set).
+
+    Parameters
+    ----------
+    max_samples : int
+        Less than 2 and above 600 will be ignored
+    tmap : GeoreferencedMap
+        Contains elevation data (TerrainMap or TiledTerrainMap)
+    transmitter_yx : Tuple[int, int]
+        Transmitter map position
+    receivers_y : np.ndarray
+        Receiver map rows
+    receivers_x : np.ndarray
+        Receiver map columns
+    distances_m : np.ndarray
+        Distances in meters between the antenna and each receiver.
+    pyramid : ElevationPyramid | None
+        If given, samples are raised to the highest square the path crosses around them (see terrain_p2p_yx)
+    bilinear : bool
+        Interpolate between the 4 squares around each sample point, instead of using the square it falls in
+        (not combined with pyramid)
+    stencils : StencilCache | None
+        If given, sample squares are read from cached ray stencils instead of being interpolated
+        (see pathloss.stencils, not combined with bilinear)
+
+    Returns
+    -------
+    profiles : np.ndarray
+        (receivers, max length) float32 surface profiles in meters, padded with NaN.
+    lengths : np.ndarray
+        Number of samples of each profile.
+    distances_km : np.ndarray
+        Distances in kilometers between the antenna and each receiver.
+
+    """
+
+    receivers_y = np.asarray(receivers_y, dtype=np.int64)
+    receivers_x = np.asarray(receivers_x, dtype=np.int64)
+    distances_m = np.asarray(distances_m, dtype=np.float64)
+    assert not (bilinear and (pyramid is not None or stencils is not None))
+
+    # determine_num_samples for every receiver
+    lengths = np.maximum(2, np.minimum(min(max_samples, 600), np.ceil(distances_m / 25).astype(np.int64)))
+    if len(lengths) == 0:
+        return np.empty((0, 2), dtype=np.float32), lengths, distances_m / 1e3
+
+    diff_y = transmitter_yx[0] - receivers_y
+    diff_x = transmitter_yx[1] - receivers_x
+
+    n = np.arange(lengths.max())
+    valid = n < lengths[:, None]
+
+    if stencils is not None:
+        offsets_y, offsets_x = stencils.offsets(diff_y, diff_x, lengths)
+        profiles = tmap.elevation_at(receivers_y[:, None] + offsets_y, receivers_x[:, None] + offsets_x)
+    else:
+        # Same floating point operations as terrain_p2p_yx, so the sample points are identical
+        sample_y = receivers_y[:, None] + ((diff_y / lengths)[:, None] * n)
+        sample_x = receivers_x[:, None] + ((diff_x / lengths)[:, None] * n)
+        # Padding samples read the receiver's square, which is always inside the map
+        sample_y = np.where(valid, sample_y, receivers_y[:, None])
+        sample_x = np.where(valid, sample_x, receivers_x[:, None])
+
+        if bilinear:
+            profiles = _bilinear(tmap, sample_y, sample_x)
+        else:
+            profiles = tmap.elevation_at(sample_y.astype(int), sample_x.astype(int))
+
+    if pyramid is not None:
+        profiles = np.maximum(profiles, pyramid.path_max(receivers_y, receivers_x, diff_y, diff_x, lengths))
+
+    profiles[~valid] = np.nan
+    return profiles, lengths, distances_m / 1e3
+
+
+def _bilinear(tmap: GeoreferencedMap, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+    height, width = tmap.shape()
+    y0 = np.floor(y).astype(np.int64)
+    x0 = np.floor(x).astype(np.int64)
+    y1 = np.minimum(y0 + 1, height - 1)
+    x1 = np.minimum(x0 + 1, width - 1)
+    wy = (y - y0).astype(np.float32)
+    wx = (x - x0).astype(np.float32)
+    # Gather the 4 corners of every sample at once
+    corners = tmap.elevation_at(np.stack((y0, y0, y1, y1)), np.stack((x0, x1, x0, x1)))
+    top = corners[0] + (corners[1] - corners[0]) * wx
+    bottom = corners[2] + (corners[3] - corners[2]) * wx
+    return top + (bottom - top) * wy
@@ -0,0 +1,109 @@
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+import rasterio
+from rasterio.plot import show
+from rasterio.warp import calculate_default_transform, reproject, transform_bounds, Resampling
+from rasterio.windows import Window, from_bounds
+from rasterio.windows import bounds as window_bounds
+from rasterio.windows import transform as window_transform
+
+import crop_elevation as crop
+import defintions as defs
+
+"""
+Crop-before-reproject preprocessing: only the window of the original EU-DEM tile around the area of interest is read
+and reprojected to the project CRS, so preparing a new area takes seconds and scratch space proportional to the area,
+instead of warping the whole tile (reproject_elevation) and cropping it afterwards (crop_elevation).
+"""
+
+
+def source_window(src, nw_corner: Tuple[float, float], se_corner: Tuple[float, float], margin: float) -> Window:
+    """Window of the source raster covering the bbox (in the source CRS, which may be rotated relative to it)
+       plus a margin in source CRS units, clipped to the raster."""
+    left, bottom, right, top = transform_bounds(crop.crs, src.crs, nw_corner[0], se_corner[1], se_corner[0],
+                                                nw_corner[1], densify_pts=21)
+    window = from_bounds(left - margin, bottom - margin, right + margin, top + margin, transform=src.transform)
+    window = window.round_offsets(op='floor').round_lengths(op='ceil')
+    return window.intersection(Window(col_off=0, row_off=0, width=src.width, height=src.height))
+
+
+def run(nw_corner: Tuple[float, float] = crop.nw_corner, se_corner: Tuple[float, float] = crop.se_corner,
+        margin: float = 1_000, source: Path = defs.ORIGINAL_ELEVATION_DATA,
+        destination: Path = defs.FINAL_ELEVATION_DATA, show_result: bool = True) -> Path:
+    """
+    Write the elevation data between two Longitude,Latitude corners, in the project CRS, to destination
+    (by default FINAL.TIF, replacing reproject_elevation.run + crop_elevation.run).
+
+    Parameters
+    ----------
+    nw_corner : Tuple[float, float]
+        Longitude,Latitude of the north-west corner
+    se_corner : Tuple[float, float]
+        Longitude,Latitude of the south-east corner
+    margin : float
+        Extra source data read around the bbox (in source CRS units, meters for EU-DEM),
+        so the reprojected window fully covers the bbox
+    source : Path
+        Elevation raster in any CRS (e.g. the original EU-DEM tile)
+    destination : Path
+        Output GeoTIFF
+
+    Returns
+    -------
+    destination : Path
+
+    """
+    with rasterio.open(source) as src:
+        nodata = src.nodata if src.nodata is not None else defs.EU_DEM_SEA_LEVEL
+
+        window = source_window(src, nw_corner, se_corner, margin)
+        print("Reading source window " + str(window), flush=True)
+        data = src.read(1, window=window)
+        data_transform = src.window_transform(window)
+
+        transform, width, height = calculate_default_transform(
+            src.crs, defs.PROJECT_CRS, window.width, window.height, *window_bounds(window, src.transform))
+        reprojected = np.full((height, width), nodata, dtype=data.dtype)
+        print("Reprojecting window to " + defs.PROJECT_CRS, flush=True)
+        reproject(
+            source=data,
+            destination=reprojected,
+            src_transform=data_transform,
+            src_crs=src.crs,
+            src_nodata=nodata,
+            dst_transform=transform,
+            dst_crs=defs.PROJECT_CRS,
+            dst_nodata=nodata,
+            resampling=Resampling.nearest)
+
+        crop_window = crop.bbox_window(transform, defs.PROJECT_CRS, nw_corner, se_corner)
+        cropped = reprojected[crop_window.row_off:crop_window.row_off + crop_window.height,
+                              crop_window.col_off:crop_window.col_off + crop_window.width]
+        assert cropped.shape == (crop_window.height, crop_window.width), "bbox is not inside the source raster"
+
+        profile = src.profile
+        profile.update({
+            'driver': 'GTiff',
+            'crs': defs.PROJECT_CRS,
+            'transform': window_transform(crop_window, transform),
+            'width': crop_window.width,
+            'height': crop_window.height,
+            'nodata': nodata
+        })
+        for block_option in ('tiled', 'blockxsize', 'blockysize'):  # Source tiling may not fit the cropped size
+            profile.pop(block_option, None)
+
+    Path(destination).parent.mkdir(parents=True, exist_ok=True)
+    with rasterio.open(destination, 'w', **profile) as dst:
+        dst.write(cropped, 1)
+    if show_result:
+        with rasterio.open(destination) as final:
+            show(final)
+
+    return destination
+
+
+if __name__ == "__main__":
+    run()
@@ -1,7 +1,13 @@
+import os
+from typing import Iterator, Tuple
+
+import numpy as np
 import rasterio
 from pyproj import CRS
 from rasterio.plot import show
 from rasterio.warp import calculate_default_transform, reproject, Resampling
+from rasterio.windows import Window
+from tqdm import tqdm
 
 import defintions as defs
 
@@ -25,29 +31,65 @@ def match(crs0, crs1):
     return False
 
 
-def run(show_reprojection: bool = True):
+def chunk_windows(width: int, height: int, chunk_size: int) -> Iterator[Window]:
+    """Destination windows of at most chunk_size × chunk_size, in row-major order."""
+    for row_off in range(0, height, chunk_size):
+        for col_off in range(0, width, chunk_size):
+            yield Window(col_off=col_off, row_off=row_off,
+                         width=min(chunk_size, width - col_off), height=min(chunk_size, height - row_off))
+
+
+def run(show_reprojection: bool = True, num_threads: int = os.cpu_count(),
+        block_size: int = 512, chunk_size: int = 4096, overview_factors: Tuple[int, ...] = (2, 4, 8, 16, 32)):
+    """
+    Reproject the original elevation data to the project CRS.
+
+    The destination is warped chunk by chunk (chunk_size × chunk_size pixels, a multiple of block_size),
+    each chunk with num_threads GDAL warp threads, so memory stays bounded by one chunk.
+    The output is a tiled (block_size × block_size), DEFLATE compressed GeoTIFF with overviews,
+    so later windowed reads (crop_elevation, terrain_map.tiled) only decode the blocks they need.
+    """
+    assert chunk_size % block_size == 0
     with rasterio.open(defs.ORIGINAL_ELEVATION_DATA) as src:
         if not match(src.crs, defs.PROJECT_CRS):
             transform, width, height = calculate_default_transform(
                 src.crs, defs.PROJECT_CRS, src.width, src.height, *src.bounds)
+            nodata = src.nodata if src.nodata is not None else defs.EU_DEM_SEA_LEVEL
             kwargs = src.meta.copy()
             kwargs.update({
+                'driver': 'GTiff',
                 'crs': defs.PROJECT_CRS,
                 'transform': transform,
                 'width': width,
-                'height': height
+                'height': height,
+                'nodata': nodata,
+                'tiled': True,
+                'blockxsize': block_size,
+                'blockysize': block_size,
+                'compress': 'deflate',
+                'predictor': 3 if np.dtype(src.dtypes[0]).kind == 'f' else 2,
+                'num_threads': num_threads,  # GDAL compression threads
+                'BIGTIFF': 'IF_SAFER'
             })
 
             with rasterio.open(defs.REPROJECTED_ELEVATION_DATA, 'w', **kwargs) as dst:
                 for i in range(1, src.count + 1):
-                    reproject(
-                        source=rasterio.band(src, i),
-                        destination=rasterio.band(dst, i),
-                        src_transform=src.transform,
-                        src_crs=src.crs,
-                        dst_transform=transform,
-                        dst_crs=defs.PROJECT_CRS,
-                        resampling=Resampling.nearest)
+                    for window in tqdm(list(chunk_windows(width, height, chunk_size)), desc="Band " + str(i)):
+                        chunk = np.full((window.height, window.width), nodata, dtype=dst.dtypes[i - 1])
+                        reproject(
+                            source=rasterio.band(src, i),
+                            destination=chunk,
+                            src_transform=src.transform,
+                            src_crs=src.crs,
+                            src_nodata=nodata,
+                            dst_transform=dst.window_transform(window),
+                            dst_crs=defs.PROJECT_CRS,
+                            dst_nodata=nodata,
+                            resampling=Resampling.nearest,
+                            num_threads=num_threads)
+                        dst.write(chunk, i, window=window)
+                dst.build_overviews(list(overview_factors), Resampling.nearest)
+                dst.update_tags(ns='rio_overview', resampling='nearest')
             if show_reprojection:
                 with rasterio.open(defs.REPROJECTED_ELEVATION_DATA) as final:
                     show(final)
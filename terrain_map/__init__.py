@@ -1,13 +1,17 @@
 from __future__ import annotations  # Required for MapPoint.distance_to(other) type hint
 
-from dataclasses import dataclass
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Tuple
 
+import numpy as np
 from affine import Affine
 from osmnx.distance import great_circle_vec
 from pyproj import Transformer
 from pyproj.enums import TransformDirection
 
+from terrain_map.pyramid import ElevationPyramid, build_pyramid
+
 
 @dataclass
 class MapPoint:
@@ -18,23 +22,59 @@ class MapPoint:
     road: bool = False
 
 
-@dataclass
-class TerrainMap:
-    """Represents a 2D map of MapPoints
-       Mapped as y-x, NOT x-y, because rasterio and PIL use y-x order"""
+class MapRow:
+    """Read-only view of a single row of a map, so tm[y][x] still returns a MapPoint."""
+
+    __slots__ = ('tmap', 'y')
+
+    def __init__(self, tmap: GeoreferencedMap, y: int):
+        self.tmap = tmap
+        self.y = y
+
+    def __getitem__(self, x: int) -> MapPoint:
+        return self.tmap.map_point((self.y, x))
+
+    def __len__(self) -> int:
+        return self.tmap.shape()[1]
+
+
+def pack_mask(mask: np.ndarray) -> np.ndarray:
+    """Bit-pack a 2D boolean mask along x (8 squares per byte)."""
+    return np.packbits(mask, axis=1)
+
+
+def unpack_mask(bits: np.ndarray, x_size: int) -> np.ndarray:
+    """Inverse of pack_mask, returns a 2D boolean mask of width x_size."""
+    return np.unpackbits(bits, axis=1, count=x_size).view(bool)
+
+
+def _test_bit(bits: np.ndarray, y: int, x: int) -> bool:
+    return bool(bits[y, x >> 3] & (0x80 >> (x & 7)))
+
+
+class GeoreferencedMap:
+    """Conversions between Longitude,Latitude coordinates and y-x map positions
+       Subclasses provide transformer, affine_transform, shape(), map_point() and elevation_at()"""
 
-    points: List[List[MapPoint]]
     transformer: Transformer
     affine_transform: Affine
 
-    def __getitem__(self, y: int) -> List[MapPoint]:
-        return self.points[y]
-
     def shape(self) -> Tuple[int, int]:
-        if len(self.points) > 0:
-            return len(self.points), len(self.points[0])
-        else:
-            return 0, 0
+        raise NotImplementedError
+
+    def map_point(self, yx_position: Tuple[int, int]) -> MapPoint:
+        raise NotImplementedError
+
+    def elevation_at(self, y, x):
+        """Elevation of one or many (numpy arrays of) map positions."""
+        raise NotImplementedError
+
+    def pyramid(self) -> ElevationPyramid | None:
+        """Downsampled elevation levels for long profiles, None if the map does not provide them."""
+        return None
+
+    def __getitem__(self, y: int) -> MapRow:
+        return MapRow(self, y)
 
     def exists(self, yx_position: Tuple[int, int]) -> bool:
         map_shape = self.shape()
@@ -53,12 +93,92 @@ class TerrainMap:
     def distance(self, map_point1: Tuple[int, int], map_point2: Tuple[int, int]) -> float:
         return coordinates_distance(self.map_yx_to_coords(map_point1), self.map_yx_to_coords(map_point2))
 
+    def coords_to_map_yx_array(self, longitudes: np.ndarray, latitudes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Array version of coords_to_map_yx, one transform call for all points."""
+        longitudes = np.asarray(longitudes, dtype=float)
+        latitudes = np.asarray(latitudes, dtype=float)
+        assert np.all((-180 <= longitudes) & (longitudes <= 180) & (-90 <= latitudes) & (latitudes <= 90))
+        raw_x, raw_y = ~self.affine_transform * self.transformer.transform(longitudes, latitudes)
+        return np.asarray(raw_y).astype(int), np.asarray(raw_x).astype(int)
+
+    def map_yx_to_coords_array(self, y: np.ndarray, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Array version of map_yx_to_coords, returns (longitudes, latitudes)."""
+        y = np.asarray(y)
+        x = np.asarray(x)
+        map_shape = self.shape()
+        assert np.all((0 <= y) & (y < map_shape[0]) & (0 <= x) & (x < map_shape[1]))
+        transformed = self.affine_transform * (x + .5, y + .5)  # .5 for center of the square
+        longitudes, latitudes = self.transformer.transform(xx=transformed[0], yy=transformed[1],
+                                                           direction=TransformDirection.INVERSE)
+        return np.asarray(longitudes), np.asarray(latitudes)
+
+
+@dataclass
+class TerrainMap(GeoreferencedMap):
+    """Represents a 2D map of 25m × 25m squares, stored as a structure of arrays
+       Mapped as y-x, NOT x-y, because rasterio and PIL use y-x order
+
+       elevation is a float32 array (meters), water_bits/road_bits are bit-packed masks (see pack_mask).
+       Hot paths should use the arrays directly, __getitem__ is only a compatibility layer."""
+
+    elevation: np.ndarray
+    water_bits: np.ndarray
+    road_bits: np.ndarray
+    transformer: Transformer
+    affine_transform: Affine
+    _pyramid: ElevationPyramid | None = field(default=None, init=False, repr=False, compare=False)
+
+    def map_point(self, yx_position: Tuple[int, int]) -> MapPoint:
+        y, x = yx_position
+        return MapPoint(elevation=float(self.elevation[y, x]),
+                        water=_test_bit(self.water_bits, y, x),
+                        road=_test_bit(self.road_bits, y, x))
+
+    def shape(self) -> Tuple[int, int]:
+        return self.elevation.shape[0], self.elevation.shape[1]
+
+    def elevation_at(self, y, x):
+        return self.elevation[y, x]
+
+    def pyramid(self) -> ElevationPyramid:
+        if self._pyramid is None:
+            self._pyramid = build_pyramid(self.elevation)
+        return self._pyramid
+
+    def water_mask(self) -> np.ndarray:
+        return unpack_mask(self.water_bits, self.shape()[1])
+
+    def road_mask(self) -> np.ndarray:
+        return unpack_mask(self.road_bits, self.shape()[1])
+
+    def set_water_mask(self, mask: np.ndarray):
+        assert mask.shape == self.shape()
+        self.water_bits = pack_mask(mask)
+
+    def set_road_mask(self, mask: np.ndarray):
+        assert mask.shape == self.shape()
+        self.road_bits = pack_mask(mask)
+
 
 def create_empty_TerrainMap(y_size: int, x_size: int, transformer: Transformer, affine_transform: Affine) -> TerrainMap:
     assert y_size > 0 and x_size > 0
-    return TerrainMap([[MapPoint() for x in range(x_size)] for y in range(y_size)], transformer, affine_transform)
+    empty_mask = pack_mask(np.zeros((y_size, x_size), dtype=bool))
+    return TerrainMap(np.zeros((y_size, x_size), dtype=np.float32), empty_mask, empty_mask.copy(),
+                      transformer, affine_transform)
+
+
+@lru_cache(maxsize=None)
+def get_transformer(crs_from: str, crs_to: str) -> Transformer:
+    """One shared (always_xy) Transformer per CRS pair, CRSs given as strings (e.g. EPSG code or WKT)."""
+    return Transformer.from_crs(crs_from=crs_from, crs_to=crs_to, always_xy=True)
 
 
 def coordinates_distance(coordinates1: Tuple[float, float], coordinates2: Tuple[float, float]) -> float:
     return great_circle_vec(lng1=coordinates1[0], lat1=coordinates1[1],
                             lng2=coordinates2[0], lat2=coordinates2[1])
+
+
+def coordinates_distance_array(longitudes1: np.ndarray, latitudes1: np.ndarray,
+                               longitudes2: np.ndarray, latitudes2: np.ndarray) -> np.ndarray:
+    """Array version of coordinates_distance (arguments are broadcast), in meters."""
+    return np.asarray(great_circle_vec(lng1=longitudes1, lat1=latitudes1, lng2=longitudes2, lat2=latitudes2))
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+import defintions as defs
+import prepare_elevation
+from terrain_map import TerrainMap
+from terrain_map import cache
+from terrain_map import load_map
+
+"""
+Terrain for arbitrary areas of interest (AOI): load_aoi(nw_corner, se_corner) returns the TerrainMap of any
+Longitude,Latitude bbox inside the source DEM, without re-running crop_elevation or overwriting FINAL.TIF.
+
+The extracted elevation rasters are kept in AOI_CACHE_DIRECTORY, named by the hash of the source raster (path, size and
+modification time) and the bbox. A request is served from any extracted region of the same source that covers it,
+so switching between known areas (or zooming into one) only reads the cached GeoTIFF. index.json records each region
+and when it was last used, the least recently used regions are deleted once the cache grows beyond max_bytes.
+"""
+
+INDEX_FILE = "index.json"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def region_key(source: Dict, nw_corner: Tuple[float, float], se_corner: Tuple[float, float]) -> str:
+    return hashlib.sha256(json.dumps({'source': source, 'nw_corner': list(nw_corner),
+                                      'se_corner': list(se_corner)}).encode()).hexdigest()
+
+
+def covers(region: Dict, nw_corner: Tuple[float, float], se_corner: Tuple[float, float]) -> bool:
+    """Whether a cached region's bbox contains the requested bbox."""
+    return (region['nw_corner'][0] <= nw_corner[0] and region['nw_corner'][1] >= nw_corner[1] and
+            region['se_corner'][0] >= se_corner[0] and region['se_corner'][1] <= se_corner[1])
+
+
+def load_index() -> Dict[str, Dict]:
+    index_file = defs.AOI_CACHE_DIRECTORY / INDEX_FILE
+    if not index_file.is_file():
+        return {}
+    with open(index_file) as f:
+        index = json.load(f)
+    # Drop regions whose raster was deleted by hand
+    return {key: region for key, region in index.items() if (defs.AOI_CACHE_DIRECTORY / region['file']).is_file()}
+
+
+def save_index(index: Dict[str, Dict]):
+    defs.AOI_CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    index_file = defs.AOI_CACHE_DIRECTORY / INDEX_FILE
+    temporary_file = index_file.with_suffix(".tmp")
+    with open(temporary_file, 'w') as f:
+        json.dump(index, f, indent=1)
+    temporary_file.replace(index_file)
+
+
+def evict(index: Dict[str, Dict], max_bytes: int, keep: str):
+    """Delete least recently used regions (never keep) until the cache fits in max_bytes."""
+    total = sum(region['bytes'] for region in index.values())
+    for key in sorted(index, key=lambda k: index[k]['last_used']):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        region = index.pop(key)
+        region_file = defs.AOI_CACHE_DIRECTORY / region['file']
+        print("Evicting AOI region " + key + " from cache", flush=True)
+        cache.remove_source(region_file)
+        region_file.unlink(missing_ok=True)
+        total -= region['bytes']
+
+
+def load_aoi(nw_corner: Tuple[float, float], se_corner: Tuple[float, float],
+             source: Path = defs.ORIGINAL_ELEVATION_DATA, road_data: Path | None = None,
+             margin: float = 1_000, max_bytes: int = DEFAULT_MAX_BYTES) -> TerrainMap:
+    """
+    TerrainMap of an area of interest, extracted from the source DEM on first use.
+
+    Parameters
+    ----------
+    nw_corner : Tuple[float, float]
+        Longitude,Latitude of the north-west corner
+    se_corner : Tuple[float, float]
+        Longitude,Latitude of the south-east corner
+    source : Path
+        Elevation raster in any CRS (e.g. the original EU-DEM tile, or a VRT mosaic of tiles)
+    road_data : Path
+        Road source, see load_map.generate
+    margin : float
+        Extra source data read around the bbox when extracting, see prepare_elevation.run
+    max_bytes : int
+        Size limit of the extracted rasters, least recently used regions are evicted beyond it
+
+    Returns
+    -------
+    tm : TerrainMap
+
+    """
+    assert nw_corner[0] < se_corner[0] and nw_corner[1] > se_corner[1], "Expected north-west and south-east corners"
+    source_info = cache.source_id(source)
+    index = load_index()
+
+    candidates = [key for key, region in index.items()
+                  if region['source'] == source_info and covers(region, nw_corner, se_corner)]
+    if candidates:
+        # The smallest covering region reads the least data
+        key = min(candidates, key=lambda k: index[k]['bytes'])
+        print("Serving AOI from cached region " + key, flush=True)
+    else:
+        key = region_key(source_info, nw_corner, se_corner)
+        region_file = defs.AOI_CACHE_DIRECTORY / (key + ".TIF")
+        print("Extracting AOI to: " + str(region_file), flush=True)
+        prepare_elevation.run(nw_corner=nw_corner, se_corner=se_corner, margin=margin, source=source,
+                              destination=region_file, show_result=False)
+        index[key] = {'file': region_file.name, 'source': source_info,
+                      'nw_corner': list(nw_corner), 'se_corner': list(se_corner),
+                      'bytes': region_file.stat().st_size}
+
+    index[key]['last_used'] = time.time()
+    evict(index, max_bytes, keep=key)
+    save_index(index)
+
+    return load_map.generate(elevation_data=defs.AOI_CACHE_DIRECTORY / index[key]['file'],
+                             nw_corner=nw_corner, se_corner=se_corner, road_data=road_data, crop_to_bbox=True)
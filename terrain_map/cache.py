@@ -0,0 +1,109 @@
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+from affine import Affine
+
+import crop_elevation as crop
+import defintions as defs
+from terrain_map import TerrainMap, get_transformer
+
+"""
+On-disk cache of finished TerrainMaps.
+
+Each entry is a directory named by the hash of the source raster's identity (path, size and modification time, so a
+cold start never reads the raster), the crop bbox, the road source and whether the read was cropped to the bbox,
+holding the arrays as .npy files (opened memory-mapped, so loading costs almost nothing) and a meta.json with the
+affine transform and CRS.
+Rewriting the source raster changes its hash, so stale entries are never used (and are deleted on the next store).
+"""
+
+CACHE_VERSION = 3
+
+ELEVATION_FILE = "elevation.npy"
+WATER_FILE = "water.npy"
+ROAD_FILE = "road.npy"
+META_FILE = "meta.json"
+
+
+def source_id(source: Path) -> Dict:
+    stat = Path(source).stat()
+    return {'path': str(Path(source).resolve()), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def entry_id(elevation_data: Path, nw_corner: Tuple[float, float], se_corner: Tuple[float, float],
+             road_data: Path, crop_to_bbox: bool) -> Dict:
+    """Everything an entry is built from except the source raster's size and modification time."""
+    return {'source': str(Path(elevation_data).resolve()), 'bbox': [list(nw_corner), list(se_corner)],
+            'road_data': str(Path(road_data).resolve()), 'crop_to_bbox': crop_to_bbox}
+
+
+def cache_key(elevation_data: Path, nw_corner: Tuple[float, float], se_corner: Tuple[float, float],
+              road_data: Path, crop_to_bbox: bool = False) -> str:
+    key = {'source': source_id(elevation_data), 'nw_corner': list(nw_corner), 'se_corner': list(se_corner),
+           'road_data': str(Path(road_data).resolve()), 'crop_to_bbox': crop_to_bbox, 'version': CACHE_VERSION}
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()[:32]
+
+
+def entry_directory(key: str) -> Path:
+    return defs.TERRAIN_CACHE_DIRECTORY / key
+
+
+def load(key: str) -> TerrainMap | None:
+    directory = entry_directory(key)
+    meta_file = directory / META_FILE
+    if not meta_file.is_file():  # meta.json is written last, so its presence marks a complete entry
+        return None
+
+    with open(meta_file) as f:
+        meta = json.load(f)
+
+    return TerrainMap(elevation=np.load(directory / ELEVATION_FILE, mmap_mode='r'),
+                      water_bits=np.load(directory / WATER_FILE, mmap_mode='r'),
+                      road_bits=np.load(directory / ROAD_FILE, mmap_mode='r'),
+                      transformer=get_transformer(crop.crs, meta['crs']),
+                      affine_transform=Affine(*meta['affine_transform']))
+
+
+def store(key: str, tm: TerrainMap, crs: str, elevation_data: Path,
+          nw_corner: Tuple[float, float], se_corner: Tuple[float, float], road_data: Path, crop_to_bbox: bool = False):
+    directory = entry_directory(key)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    np.save(directory / ELEVATION_FILE, tm.elevation)
+    np.save(directory / WATER_FILE, tm.water_bits)
+    np.save(directory / ROAD_FILE, tm.road_bits)
+
+    entry = entry_id(elevation_data, nw_corner, se_corner, road_data, crop_to_bbox)
+    meta = dict(entry, crs=crs, affine_transform=list(tm.affine_transform)[:6])
+    with open(directory / META_FILE, 'w') as f:
+        json.dump(meta, f)
+
+    # Remove entries built from an older version of the same raster (with the same bbox, roads and cropping)
+    for other in defs.TERRAIN_CACHE_DIRECTORY.iterdir():
+        other_meta_file = other / META_FILE
+        if other != directory and other_meta_file.is_file():
+            with open(other_meta_file) as f:
+                other_meta = json.load(f)
+            if all(other_meta.get(name) == value for name, value in entry.items()):
+                shutil.rmtree(other, ignore_errors=True)
+
+
+def remove_source(elevation_data: Path):
+    """Remove all entries built from a raster (e.g. when the raster itself is deleted)."""
+    if not defs.TERRAIN_CACHE_DIRECTORY.is_dir():
+        return
+    source = str(Path(elevation_data).resolve())
+    for entry in defs.TERRAIN_CACHE_DIRECTORY.iterdir():
+        meta_file = entry / META_FILE
+        if meta_file.is_file():
+            with open(meta_file) as f:
+                if json.load(f).get('source') == source:
+                    shutil.rmtree(entry, ignore_errors=True)
+
+
+def clear():
+    shutil.rmtree(defs.TERRAIN_CACHE_DIRECTORY, ignore_errors=True)
@@ -1,82 +1,71 @@
-import math
+from pathlib import Path
 
-import osmnx
+import numpy as np
 import rasterio
-from tqdm import tqdm
+from rasterio.windows import Window
 
 import crop_elevation as crop
 import defintions as defs
 from terrain_map import *
+from terrain_map import cache
+from terrain_map import roads
 
 
 def range_inclusive(start: int, end: int):
     return range(start, end + 1)
 
 
-def get_road_map_points(tmap: TerrainMap, coords_list: List[Tuple[float, float]]) -> List[Tuple[int, int]]:
-    map_points: List[Tuple[int, int]] = []
-
-    for coords in coords_list:
-        raw_map_point = tmap.coords_to_map_yx(coords)
-        if len(map_points) > 0:
-            last_point = map_points[-1]
-            diff_y = raw_map_point[0] - last_point[0]
-            diff_x = raw_map_point[1] - last_point[1]
-            dist = math.sqrt(diff_y ** 2 + diff_x ** 2)
-            dist_int = int(dist)
-            for n in range(1, dist_int):
-                waypoint = (int(last_point[0] + ((diff_y / dist_int) * n)),
-                            int(last_point[1] + ((diff_x / dist_int) * n)))
-                if waypoint not in map_points and tmap.exists(waypoint):
-                    map_points.append(waypoint)
-        if tmap.exists(raw_map_point):
-            map_points.append(raw_map_point)
+loaded_terrain_map: TerrainMap | None = None
 
-    return map_points
 
+def generate(elevation_data=defs.FINAL_ELEVATION_DATA,
+             nw_corner: Tuple[float, float] = crop.nw_corner, se_corner: Tuple[float, float] = crop.se_corner,
+             road_data: Path | None = None, use_cache: bool = True, crop_to_bbox: bool = False):
+    global loaded_terrain_map
 
-loaded_terrain_map: TerrainMap | None = None
+    if road_data is None:
+        road_data = roads.default_road_data(nw_corner, se_corner)
 
+    if use_cache:
+        key = cache.cache_key(elevation_data, nw_corner, se_corner, road_data, crop_to_bbox)
+        tm = cache.load(key)
+        if tm is not None:
+            print("Loaded TerrainMap from cache (" + key + ")", flush=True)
+            loaded_terrain_map = tm
+            return tm
 
-def generate(elevation_data=defs.FINAL_ELEVATION_DATA):
     # Elevation Data
     with rasterio.open(elevation_data) as src:
         print("Loading Elevation Data", flush=True)
-        transform = src.transform
-        transformer = Transformer.from_crs(crs_from=crop.crs, crs_to=src.crs, always_xy=True)
-        data_band = src.read(1)
+        crs = src.crs.to_wkt()
+        transformer = get_transformer(crop.crs, crs)
+        if crop_to_bbox:  # Only read the bbox out of a larger raster
+            window = crop.bbox_window(src.transform, src.crs, nw_corner, se_corner)
+            window = window.intersection(Window(col_off=0, row_off=0, width=src.width, height=src.height))
+            transform = src.window_transform(window)
+            data_band = src.read(1, window=window)
+        else:
+            transform = src.transform
+            data_band = src.read(1)
         assert data_band.shape[0] > 0 and data_band.shape[1] > 0
-        print("Creating an empty TerrainMap", flush=True)
-        tm = create_empty_TerrainMap(data_band.shape[0], data_band.shape[1], transformer, transform)
-        print("Created an empty TerrainMap with shape (y, x) = " + str(tm.shape()), flush=True)
-
         print("Filling TerrainMap with Elevation & Water Data", flush=True)
-        with tqdm(total=data_band.shape[0] * data_band.shape[1], smoothing=.025) as progress_bar:
-            for y in range(0, data_band.shape[0]):
-                for x in range(0, data_band.shape[1]):
-                    if data_band[y][x] == defs.EU_DEM_SEA_LEVEL:
-                        tm[y][x].water = True
-                    else:
-                        tm[y][x].elevation = data_band[y][x]
-                    progress_bar.update(1)
+        water = data_band == defs.EU_DEM_SEA_LEVEL
+        elevation = np.where(water, 0, data_band).astype(np.float32, copy=False)
+        tm = TerrainMap(elevation, pack_mask(water), pack_mask(np.zeros_like(water)), transformer, transform)
+        print("Created TerrainMap with shape (y, x) = " + str(tm.shape()), flush=True)
         print("Finished loading Elevation & Water Data", flush=True)
 
     # Road Data
     print("Loading Road Data", flush=True)
-    road_data = osmnx.graph_from_bbox(west=crop.nw_corner[0], north=crop.nw_corner[1], east=crop.se_corner[0],
-                                      south=crop.se_corner[1], network_type='drive', retain_all=True,
-                                      truncate_by_edge=True, clean_periphery=True)
+    road_geometries = roads.load_road_geometries(road_data, nw_corner, se_corner)
 
     print("Filling TerrainMap with Road Data", flush=True)
-    for road in road_data.edges(data=True):
-        if "geometry" in road[2]:
-            geo_points = road[2]["geometry"]
-            for map_point in get_road_map_points(tm, geo_points.coords):
-                y = map_point[0]
-                x = map_point[1]
-                tm[y][x].road = True
+    tm.set_road_mask(roads.rasterize_roads(road_geometries, tm.shape(), crs, transform))
+
+    if use_cache:
+        print("Storing TerrainMap in cache (" + key + ")", flush=True)
+        cache.store(key, tm, crs, elevation_data, nw_corner, se_corner, road_data, crop_to_bbox)
 
-    global loaded_terrain_map
     loaded_terrain_map = tm
 
     print("Finished generating TerrainMap", flush=True)
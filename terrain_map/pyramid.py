@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+MEAN = "mean"
+MAX = "max"
+
+
+@dataclass
+class ElevationPyramid:
+    """Downsampled elevation levels of a map: level k covers 2^k × 2^k squares per cell
+       Level 0 is the full resolution elevation array. Every level keeps both the mean and the max of its squares.
+       Sparse profiles are made obstruction-preserving with path_max, which reads the full resolution squares
+       the path crosses (a coarse cell's max would also take in squares off the path)."""
+
+    mean: List[np.ndarray]
+    max: List[np.ndarray]
+
+    def levels(self) -> int:
+        return len(self.mean)
+
+    def sample(self, y: np.ndarray, x: np.ndarray, level: int, statistic: str = MAX) -> np.ndarray:
+        """Elevations at full resolution map positions, read from the given level."""
+        assert statistic in (MEAN, MAX)
+        elevation = self.max[level] if statistic == MAX else self.mean[level]
+        return elevation[np.right_shift(y, level), np.right_shift(x, level)]
+
+    def path_max(self, receivers_y: np.ndarray, receivers_x: np.ndarray, diff_y: np.ndarray, diff_x: np.ndarray,
+                 lengths: np.ndarray) -> np.ndarray:
+        """See segment_max, on the full resolution elevations."""
+        return segment_max(self.max[0], receivers_y, receivers_x, diff_y, diff_x, lengths)
+
+
+max_events: int = 1 << 21  # Line crossings processed at once by segment_max
+
+
+def segment_max(elevation: np.ndarray, receivers_y: np.ndarray, receivers_x: np.ndarray,
+                diff_y: np.ndarray, diff_x: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    (paths, lengths.max()) array of the max elevation of the squares crossed by each path's line around each of
+    its samples, -inf for the end samples and padding.
+    Sample n of a path lies at receiver + diff * n / lengths (as terrain_profiles_yx places it), the stretch of line
+    between the midpoints to samples n - 1 and n + 1 belongs to it, the first and last half stretches to the second and
+    second to last samples (so the end samples, the ground under the antennas, keep their own elevation).
+    The squares are those the line actually passes through: it is cut at every row and column boundary and at the
+    stretch ends, and each piece read at its midpoint.
+    """
+    receivers_y = np.asarray(receivers_y, dtype=np.int64)
+    receivers_x = np.asarray(receivers_x, dtype=np.int64)
+    diff_y = np.asarray(diff_y, dtype=np.int64)
+    diff_x = np.asarray(diff_x, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    width = int(lengths.max()) if len(lengths) else 0
+    output = np.full((len(lengths), width), -np.inf, dtype=np.float32)
+
+    # Cuts: row and column boundaries (at t = j / |diff|), stretch ends ((n + 0.5) / lengths), both path ends
+    counts = np.abs(diff_y) + np.abs(diff_x) + np.maximum(lengths - 3, 0) + 2
+    ends = np.cumsum(counts)
+    first = 0
+    while first < len(lengths):
+        # Chunks of at most max_events cuts (and at least one path)
+        done = int(ends[first - 1]) if first else 0
+        last = max(int(np.searchsorted(ends, done + max_events, side='right')), first + 1)
+        _segment_max(elevation, receivers_y[first:last], receivers_x[first:last], diff_y[first:last],
+                     diff_x[first:last], lengths[first:last], counts[first:last], output[first:last])
+        first = last
+    return output
+
+
+def _steps(counts: np.ndarray):
+    """Path of every step and its index (from 1) within the path, for counts steps per path."""
+    paths = np.repeat(np.arange(len(counts)), counts)
+    return paths, np.arange(1, len(paths) + 1) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def _segment_max(elevation, receivers_y, receivers_x, diff_y, diff_x, lengths, counts, output):
+    ay, ax = np.abs(diff_y), np.abs(diff_x)
+    t_end = (lengths - 1) / lengths  # The last sample
+    rows_y, j_y = _steps(ay)
+    rows_x, j_x = _steps(ax)
+    rows_s, j_s = _steps(np.maximum(lengths - 3, 0))
+    rows = np.arange(len(lengths))
+    paths = np.concatenate((rows_y, rows_x, rows_s, rows, rows))
+    t = np.concatenate((j_y / ay[rows_y], j_x / ax[rows_x], (j_s + 0.5) / lengths[rows_s],
+                        np.zeros(len(rows)), t_end))
+    t = np.minimum(t, t_end[paths])
+
+    order = np.argsort(paths + t)  # t < 1: sorts by path then position, much faster than np.lexsort
+    paths, t = paths[order], t[order]
+    pieces = np.flatnonzero((paths[:-1] == paths[1:]) & (t[1:] > t[:-1]))
+    paths = paths[pieces]
+    n = lengths[paths]
+    m = (t[pieces] + t[pieces + 1]) * 0.5
+    y = np.floor(receivers_y[paths] + diff_y[paths] * m).astype(np.int64)
+    x = np.floor(receivers_x[paths] + diff_x[paths] * m).astype(np.int64)
+    sample = np.clip(np.rint(m * n).astype(np.int64), 1, n - 2)
+
+    # Pieces are sorted by path and position, so each sample's pieces are contiguous
+    keep = n >= 3
+    key = (paths * output.shape[1] + sample)[keep]
+    if len(key) == 0:
+        return
+    starts = np.concatenate(([0], np.flatnonzero(key[1:] != key[:-1]) + 1))
+    output.flat[key[starts]] = np.maximum.reduceat(elevation[y[keep], x[keep]], starts)
+
+
+def _downsample(elevation: np.ndarray, reduce) -> np.ndarray:
+    # Pad odd edges by repeating the last row/column, so every cell covers exactly 2 × 2 squares
+    padded = np.pad(elevation, ((0, elevation.shape[0] % 2), (0, elevation.shape[1] % 2)), mode='edge')
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+    return reduce(blocks, axis=(1, 3)).astype(np.float32, copy=False)
+
+
+def build_pyramid(elevation: np.ndarray, levels: int = 4) -> ElevationPyramid:
+    """Build levels 0 (full resolution) up to levels - 1 (default: 1x, 2x, 4x and 8x)."""
+    assert levels >= 1
+    pyramid = ElevationPyramid(mean=[elevation], max=[elevation])
+    for _ in range(1, levels):
+        pyramid.mean.append(_downsample(pyramid.mean[-1], np.mean))
+        pyramid.max.append(_downsample(pyramid.max[-1], np.max))
+    return pyramid
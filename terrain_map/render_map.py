@@ -1,11 +1,35 @@
+from typing import Tuple
+
 import numpy as np
 from PIL import Image
-from tqdm import tqdm
 
 import defintions as defs
 from terrain_map import TerrainMap
 from terrain_map import load_map
-from terrain_map.load_map import range_inclusive
+
+
+RED = (255, 0, 0)
+DEEP_PINK = (255, 20, 147)
+YELLOW = (255, 255, 0)
+
+
+def composite(map_img: np.ndarray, mask: np.ndarray, colour: Tuple[int, int, int], opacity: float = 1):
+    """Alpha-blend colour over every pixel of map_img where mask is True (mask may also hold float opacities)."""
+    if mask.dtype == bool:
+        pixels = map_img[mask]
+        map_img[mask] = np.rint((pixels * (1 - opacity)) + (np.asarray(colour) * opacity))
+    else:
+        alpha = (mask * opacity)[..., np.newaxis]
+        map_img[...] = np.rint((map_img * (1 - alpha)) + (np.asarray(colour) * alpha))
+
+
+def overlay_rgba(covered: np.ndarray, transmitter_marker: np.ndarray, opacity: float = 1 / 3) -> np.ndarray:
+    """Coverage as its own (y, x, 4) RGBA layer, transparent outside the covered squares and the transmitter marker,
+       to be shown over the base render (e.g. as separate tile layers, see xyz_tiles.export)."""
+    overlay = np.zeros(covered.shape + (4,), dtype=np.uint8)
+    overlay[covered] = RED + (round(255 * opacity),)
+    overlay[transmitter_marker] = DEEP_PINK + (255,)
+    return overlay
 
 
 def draw_red(map_img: np.ndarray, y: int, x: int, opacity: float):
@@ -27,56 +51,41 @@ def draw_yellow(map_img: np.ndarray, y: int, x: int):
     map_img[y, x, 2] = 0
 
 
-def is_drawn(map_img: np.ndarray, y: int, x: int) -> bool:
-    return map_img[y, x, 0] != 0 or map_img[y, x, 1] != 0 or map_img[y, x, 2] != 0
-
-
-def draw_road_point(tm: TerrainMap, map_img: np.ndarray, y: int, x: int):
-    for yy in range_inclusive(y - 1, y + 1):
-        for xx in range_inclusive(x - 1, x + 1):
-            if tm.exists((yy, xx)):
-                draw_yellow(map_img, yy, xx)
+def dilate_roads(road: np.ndarray) -> np.ndarray:
+    """Grow every road square into its 3×3 neighbourhood (clipped at the map edges)."""
+    padded = np.pad(road, 1)
+    dilated = np.zeros_like(road)
+    for dy in range(3):
+        for dx in range(3):
+            dilated |= padded[dy:dy + road.shape[0], dx:dx + road.shape[1]]
+    return dilated
 
 
 def render(tm: TerrainMap, draw_roads: bool = True) -> np.ndarray:
     print("Searching for minimum and maximum elevation", flush=True)
-    height_min = float("inf")
-    height_max = float("-inf")
-    max_loc = (-1, -1)
-    min_loc = (-1, -1)
     yx_size = tm.shape()
-    for y in range(yx_size[0]):
-        for x in range(yx_size[1]):
-            map_point = tm[y][x]
-            if map_point.elevation > height_max and not map_point.water:
-                height_max = map_point.elevation
-                max_loc = (y, x)
-            elif map_point.elevation < height_min and not map_point.water:
-                height_min = map_point.elevation
-                min_loc = (y, x)
+    elevation = np.asarray(tm.elevation)
+    water = tm.water_mask()
+    land_elevation = np.ma.masked_array(elevation, mask=water)
+    max_loc = np.unravel_index(land_elevation.argmax(), yx_size)
+    min_loc = np.unravel_index(land_elevation.argmin(), yx_size)
+    height_max = elevation[max_loc]
+    height_min = elevation[min_loc]
     height_diff = height_max - height_min
-    print("Min elv. = " + str(height_min) + "m @" + str(min_loc) + " | Max elv. = " + str(height_max) +
-          "m @" + str(max_loc) + " | Diff elv. = " + str(height_diff) + "m", flush=True)
+    print("Min elv. = " + str(height_min) + "m @" + str(tuple(map(int, min_loc))) + " | Max elv. = " +
+          str(height_max) + "m @" + str(tuple(map(int, max_loc))) + " | Diff elv. = " + str(height_diff) + "m",
+          flush=True)
 
-    print("Creating empty image rendering array", flush=True)
+    print("Render drawing started", flush=True)
     # Create empty RGB image/pixel/map array
     map_render = np.zeros((yx_size[0], yx_size[1], 3), 'uint8')
 
-    print("Render drawing started", flush=True)
-    with tqdm(total=yx_size[0] * yx_size[1], smoothing=.025) as progress_bar:
-        for y in range(0, yx_size[0]):
-            for x in range(0, yx_size[1]):
-                point = tm[y][x]
-                if is_drawn(map_render, y, x):  # Skip if already drawn on (if road [drawn as 3×3] is next to pixel)
-                    continue
-                elif draw_roads and point.road is True:
-                    draw_road_point(tm, map_render, y, x)  # Draw road
-                elif point.water is True:  # Draw water
-                    map_render[y, x, 2] = 255  # Blue (band 2) for water
-                else:  # Draw terrain
-                    # Closest to min.height = 50G, closest to max.height = 200G | Green (band 1) for terrain
-                    map_render[y, x, 1] = 50 + (((point.elevation - height_min) / height_diff) * 150)
-                progress_bar.update(1)
+    # Closest to min.height = 50G, closest to max.height = 200G | Green (band 1) for terrain
+    land = ~water
+    map_render[land, 1] = 50 + (((elevation[land] - height_min) / height_diff) * 150)
+    map_render[water, 2] = 255  # Blue (band 2) for water
+    if draw_roads:
+        map_render[dilate_roads(tm.road_mask())] = YELLOW  # Roads drawn as 3×3
     print("Finished drawing", flush=True)
 
     return map_render
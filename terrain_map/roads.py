@@ -0,0 +1,83 @@
+from pathlib import Path
+from typing import Tuple
+
+import geopandas
+import numpy as np
+import osmnx
+from affine import Affine
+from rasterio import features
+
+import crop_elevation as crop
+import defintions as defs
+
+GRAPH_SUFFIXES = (".graphml",)
+OSM_XML_SUFFIXES = (".osm", ".xml")
+
+
+def default_road_data(nw_corner: Tuple[float, float], se_corner: Tuple[float, float]) -> Path:
+    """Local road graph file used for a bbox when no road source is given."""
+    return defs.ROAD_DATA_DIRECTORY / ("roads_" + "_".join(str(c) for c in (*nw_corner, *se_corner)) + ".graphml")
+
+
+def download_road_graph(road_data: Path, nw_corner: Tuple[float, float], se_corner: Tuple[float, float]):
+    """Download the drivable OSM road graph for a bbox and save it as GraphML, so later loads work offline."""
+    print("Downloading Road Data to: " + str(road_data), flush=True)
+    road_graph = osmnx.graph_from_bbox(west=nw_corner[0], north=nw_corner[1], east=se_corner[0],
+                                       south=se_corner[1], network_type='drive', retain_all=True,
+                                       truncate_by_edge=True, clean_periphery=True)
+    road_data.parent.mkdir(parents=True, exist_ok=True)
+    osmnx.save_graphml(road_graph, filepath=road_data)
+
+
+def load_road_geometries(road_data: Path,
+                         nw_corner: Tuple[float, float] = crop.nw_corner,
+                         se_corner: Tuple[float, float] = crop.se_corner) -> geopandas.GeoSeries:
+    """
+    Load road centre-lines from a local road source.
+
+    Parameters
+    ----------
+    road_data : Path
+        A GraphML road graph (as saved by osmnx.save_graphml), an OSM XML extract (.osm/.xml),
+        or any vector file geopandas can read (e.g. GeoJSON, GeoPackage).
+        A missing GraphML file is downloaded from OSM once and saved to this path.
+    nw_corner : Tuple[float, float]
+        Longitude,Latitude of the north-west corner of the area of interest
+    se_corner : Tuple[float, float]
+        Longitude,Latitude of the south-east corner of the area of interest
+
+    Returns
+    -------
+    geometries : GeoSeries
+        Road geometries, with their CRS set.
+
+    """
+    road_data = Path(road_data)
+    suffix = road_data.suffix.lower()
+
+    if suffix in GRAPH_SUFFIXES or suffix in OSM_XML_SUFFIXES:
+        if suffix in GRAPH_SUFFIXES:
+            if not road_data.is_file():
+                download_road_graph(road_data, nw_corner, se_corner)
+            road_graph = osmnx.load_graphml(road_data)
+        else:
+            road_graph = osmnx.graph_from_xml(road_data, retain_all=True)
+        # fill_edge_geometry gives straight edges (no 'geometry' attribute) a line between their nodes
+        edges = osmnx.graph_to_gdfs(road_graph, nodes=False, fill_edge_geometry=True)
+        return edges.geometry
+
+    bbox = (nw_corner[0], se_corner[1], se_corner[0], nw_corner[1])
+    return geopandas.read_file(road_data, bbox=bbox).geometry
+
+
+def rasterize_roads(geometries: geopandas.GeoSeries, shape: Tuple[int, int],
+                    crs, affine_transform: Affine) -> np.ndarray:
+    """Burn all road geometries into a (y, x) boolean mask in one pass."""
+    geometries = geometries[geometries.notna() & ~geometries.is_empty]
+    if len(geometries) == 0:
+        return np.zeros(shape, dtype=bool)
+
+    projected = geometries.to_crs(crs)
+    burned = features.rasterize(((geometry, 1) for geometry in projected), out_shape=shape,
+                                transform=affine_transform, fill=0, all_touched=True, dtype='uint8')
+    return burned.view(bool)
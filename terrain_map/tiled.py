@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from typing import Tuple
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+import crop_elevation as crop
+import defintions as defs
+from terrain_map import GeoreferencedMap, MapPoint, get_transformer
+
+
+class TiledTerrainMap(GeoreferencedMap):
+    """Elevation map backed by a (large) raster that is read in fixed-size tiles on demand
+       Only the most recently used tiles are kept decoded, so memory scales with the area around the transmitters,
+       not with the extent of the DEM. To span neighbouring EU-DEM tiles, open a VRT mosaic of them (gdalbuildvrt).
+       Roads are not loaded, so this backend serves terrain profiles (pathloss.terrain_module), not rendering."""
+
+    def __init__(self, elevation_data=defs.REPROJECTED_ELEVATION_DATA, tile_size: int = 512, max_tiles: int = 64):
+        assert tile_size > 0 and max_tiles > 0
+        self.dataset = rasterio.open(elevation_data)
+        self.transformer = get_transformer(crop.crs, self.dataset.crs.to_wkt())
+        self.affine_transform = self.dataset.transform
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.tiles: OrderedDict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.tiles.clear()
+        self.dataset.close()
+
+    def shape(self) -> Tuple[int, int]:
+        return self.dataset.height, self.dataset.width
+
+    def tile(self, tile_y: int, tile_x: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Decoded (elevation, water) arrays of a tile, read from the raster if not in the LRU cache."""
+        key = (tile_y, tile_x)
+        cached = self.tiles.get(key)
+        if cached is not None:
+            self.tiles.move_to_end(key)
+            return cached
+
+        row_off = tile_y * self.tile_size
+        col_off = tile_x * self.tile_size
+        height, width = self.shape()
+        window = Window(col_off=col_off, row_off=row_off,
+                        width=min(self.tile_size, width - col_off), height=min(self.tile_size, height - row_off))
+        data = self.dataset.read(1, window=window)
+        water = data == defs.EU_DEM_SEA_LEVEL
+        decoded = np.where(water, 0, data).astype(np.float32, copy=False), water
+
+        self.tiles[key] = decoded
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return decoded
+
+    def elevation_at(self, y, x):
+        ys = np.asarray(y, dtype=np.int64)
+        xs = np.asarray(x, dtype=np.int64)
+        if ys.ndim == 0:
+            return self.tile(int(ys) // self.tile_size, int(xs) // self.tile_size)[0][
+                int(ys) % self.tile_size, int(xs) % self.tile_size]
+
+        ys, xs = np.broadcast_arrays(ys, xs)
+        tile_ys = ys // self.tile_size
+        tile_xs = xs // self.tile_size
+        elevations = np.empty(ys.shape, dtype=np.float32)
+        # One gather per tile touched (a profile crosses a handful of tiles at most)
+        for tile_y, tile_x in set(zip(tile_ys.ravel().tolist(), tile_xs.ravel().tolist())):
+            in_tile = (tile_ys == tile_y) & (tile_xs == tile_x)
+            elevation = self.tile(tile_y, tile_x)[0]
+            elevations[in_tile] = elevation[ys[in_tile] % self.tile_size, xs[in_tile] % self.tile_size]
+        return elevations
+
+    def map_point(self, yx_position: Tuple[int, int]) -> MapPoint:
+        y, x = yx_position
+        elevation, water = self.tile(y // self.tile_size, x // self.tile_size)
+        y %= self.tile_size
+        x %= self.tile_size
+        return MapPoint(elevation=float(elevation[y, x]), water=bool(water[y, x]))
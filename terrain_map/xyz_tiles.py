@@ -0,0 +1,133 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import numpy as np
+from PIL import Image
+from rasterio.transform import from_origin
+from rasterio.warp import reproject, transform_bounds, Resampling
+
+from terrain_map import GeoreferencedMap
+
+"""
+Export of rendered maps as an XYZ ("slippy map") tile pyramid: <directory>/<z>/<x>/<y>.png, 256×256 pixels,
+in Web Mercator (EPSG:3857) as used by Leaflet/OpenLayers, so a browser only loads the tiles on screen.
+The base render and the coverage overlay are exported as separate layers (see coverage_model's example), the overlay's
+fully transparent tiles are not written.
+"""
+
+TILE_SIZE = 256
+WEB_MERCATOR = "EPSG:3857"
+WEB_MERCATOR_ORIGIN = 20037508.342789244  # Half the circumference of the Web Mercator world, in meters
+
+
+def tile_span(zoom: int) -> float:
+    """Width/height of one tile at a zoom level, in Web Mercator meters."""
+    return 2 * WEB_MERCATOR_ORIGIN / (2 ** zoom)
+
+
+def max_zoom_for(tm: GeoreferencedMap) -> int:
+    """Lowest zoom level whose tile pixels are no larger than the map's squares."""
+    square_size = abs(tm.affine_transform.a)
+    return max(0, math.ceil(math.log2(tile_span(0) / (TILE_SIZE * square_size))))
+
+
+def mercator_bounds(tm: GeoreferencedMap) -> Tuple[float, float, float, float]:
+    map_shape = tm.shape()
+    left, top = tm.affine_transform * (0, 0)
+    right, bottom = tm.affine_transform * (map_shape[1], map_shape[0])
+    return transform_bounds(tm.transformer.target_crs, WEB_MERCATOR,
+                            min(left, right), min(bottom, top), max(left, right), max(bottom, top))
+
+
+def tiles_covering(bounds: Tuple[float, float, float, float], zoom: int) -> Iterator[Tuple[int, int]]:
+    span = tile_span(zoom)
+    last = 2 ** zoom - 1
+    min_x = max(0, int((bounds[0] + WEB_MERCATOR_ORIGIN) // span))
+    max_x = min(last, int((bounds[2] + WEB_MERCATOR_ORIGIN) // span))
+    min_y = max(0, int((WEB_MERCATOR_ORIGIN - bounds[3]) // span))
+    max_y = min(last, int((WEB_MERCATOR_ORIGIN - bounds[1]) // span))
+    for x in range(min_x, max_x + 1):
+        for y in range(min_y, max_y + 1):
+            yield x, y
+
+
+def to_rgba(image: np.ndarray) -> np.ndarray:
+    """(y, x, 3) RGB or (y, x, 4) RGBA image to RGBA, RGB images are fully opaque."""
+    if image.shape[2] == 4:
+        return image
+    return np.dstack((image, np.full(image.shape[:2], 255, dtype=np.uint8)))
+
+
+def render_tile(rgba: np.ndarray, tm: GeoreferencedMap, zoom: int, x: int, y: int, resampling: Resampling) \
+        -> np.ndarray | None:
+    """Warp the part of the image inside one tile, None if the tile would be fully transparent."""
+    span = tile_span(zoom)
+    tile_transform = from_origin(-WEB_MERCATOR_ORIGIN + x * span, WEB_MERCATOR_ORIGIN - y * span,
+                                 span / TILE_SIZE, span / TILE_SIZE)
+    tile = np.zeros((4, TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+    reproject(source=np.moveaxis(rgba, 2, 0), destination=tile,
+              src_transform=tm.affine_transform, src_crs=tm.transformer.target_crs,
+              dst_transform=tile_transform, dst_crs=WEB_MERCATOR,
+              resampling=resampling)
+    if not tile[3].any():
+        return None
+    return np.moveaxis(tile, 0, 2)
+
+
+def export(image: np.ndarray, tm: GeoreferencedMap, directory: Path,
+           min_zoom: int | None = None, max_zoom: int | None = None, workers: int | None = None) -> int:
+    """
+    Write an image of a map (e.g. a coverage render) as an XYZ tile pyramid.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        (y, x, 3) RGB or (y, x, 4) RGBA image with the map's shape, e.g. render_map.render's base map
+        or render_map.overlay_rgba's coverage layer (exported to separate directories, viewers stack them)
+    tm : GeoreferencedMap
+        Map the image was rendered from (provides its CRS and affine transform)
+    directory : Path
+        Output directory, tiles are written to <directory>/<z>/<x>/<y>.png
+    min_zoom : int
+        Lowest zoom level, defaults to the level where the whole map fits in about one tile
+    max_zoom : int
+        Highest zoom level, defaults to the level matching the map's resolution
+    workers : int
+        Number of threads rendering and writing tiles (defaults to the number of CPUs)
+
+    Returns
+    -------
+    tiles : int
+        Number of tiles written (fully transparent tiles are skipped).
+
+    """
+    assert image.shape[:2] == tm.shape()
+    rgba = to_rgba(image)
+    bounds = mercator_bounds(tm)
+    if max_zoom is None:
+        max_zoom = max_zoom_for(tm)
+    if min_zoom is None:
+        extent = max(bounds[2] - bounds[0], bounds[3] - bounds[1])
+        min_zoom = min(max_zoom, max(0, int(math.log2(tile_span(0) / extent))))
+
+    def write_tile(zoom: int, x: int, y: int) -> bool:
+        resampling = Resampling.nearest if zoom == max_zoom else Resampling.average
+        tile = render_tile(rgba, tm, zoom, x, y, resampling)
+        if tile is None:
+            return False
+        tile_file = Path(directory) / str(zoom) / str(x) / (str(y) + ".png")
+        tile_file.parent.mkdir(parents=True, exist_ok=True)
+        Image.fromarray(tile, mode="RGBA").save(fp=tile_file, format="PNG")
+        return True
+
+    print("Exporting XYZ tiles (zoom " + str(min_zoom) + "-" + str(max_zoom) + ") to: " + str(directory), flush=True)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [executor.submit(write_tile, zoom, x, y)
+                   for zoom in range(min_zoom, max_zoom + 1)
+                   for x, y in tiles_covering(bounds, zoom)]
+        written = sum(future.result() for future in futures)
+    print("Exported " + str(written) + " tiles", flush=True)
+    return written